@@ -1,60 +1,51 @@
 
 
-def get_overlapping_query(start, end ):
-    return [
-            # Nueva reserva empieza antes y termina durante una reserva existente
-            {
-                "start_time": {"$lt": start},
-                "end_time": {"$gte": start, "$lte": end}
-            },
-            # Nueva reserva empieza antes y termina después de una reserva existente
-            {
-                "start_time": {"$lt": start},
-                "end_time": {"$gte": end}
-            },
-            # Nueva reserva empieza durante una reserva existente y termina durante
-            {
-                "start_time": {"$gte": start, "$lte": end},
-                "end_time": {"$gte": start, "$lte": end}
-            },
-            # Nueva reserva empieza durante una reserva existente y termina después
-            {
-                "start_time": {"$gte": start, "$lte": end},
-                "end_time": {"$gt": end}
-            },
-            # Nueva reserva comienza durante una reserva existente
-            {
-                "start_time": {"$lte": end},
-                "end_time": {"$gt": start}
-            },
-            # Nueva reserva termina durante una reserva existente
-            {
-                "start_time": {"$lt": end},
-                "end_time": {"$gte": start}
-            },
-            # Nueva reserva completamente contiene una reserva existente
-            {
-                "start_time": {"$gte": start},
-                "end_time": {"$lte": end}
-            },
-            # Nueva reserva comienza antes de una reserva existente
-            {
-                "start_time": {"$lt": start},
-                "end_time": {"$gte": start}
-            },
-            # Nueva reserva termina después de una reserva existente
-            {
-                "start_time": {"$lte": end},
-                "end_time": {"$gt": end}
-            },
-            # Nueva reserva empieza después y termina después
-            {
-                "start_time": {"$gte": start},
-                "end_time": {"$gte": end}
-            },
-            # Nueva reserva empieza antes de una reserva existente y termina después
-            {
-                "start_time": {"$lte": start},
-                "end_time": {"$gte": end}
-            }
-            ]
\ No newline at end of file
+def get_overlapping_query(start, end, max_duration=None):
+    """
+    Devuelve el filtro de solapamiento entre una reserva nueva [start, end) y las
+    reservas existentes.
+
+    Dos intervalos semiabiertos se solapan si y solo si cada uno empieza antes de
+    que termine el otro. Con un único rango sobre start_time y otro sobre end_time
+    el planificador puede resolver la consulta con los índices compuestos
+    (resource_id, end_time, start_time) y (resource_id, start_time, end_time)
+    declarados en app/indexes.py; benchmarks/scenarios.py:overlap_query_plan
+    comprueba el plan.
+
+    Con max_duration (la duración máxima de las reservas del recurso) solo pueden
+    solaparse las que empiezan después de start - max_duration, y el rango sobre
+    start_time queda acotado por los dos lados en cualquier punto del historial.
+    """
+    start_range = {"$lt": end}
+    if max_duration is not None:
+        start_range["$gt"] = start - max_duration
+    return {
+        "start_time": start_range,
+        "end_time": {"$gt": start}
+    }
+
+# Formato de las fechas recibidas como parámetros de consulta
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+def get_free_slots(bookings, start, end, min_duration):
+    """
+    Recorre una sola vez las reservas ordenadas por start_time y devuelve los huecos
+    libres dentro de [start, end) de al menos min_duration.
+
+    :param bookings: Iterable de tuplas (start_time, end_time) ordenado por start_time.
+    :param start: Inicio de la ventana consultada.
+    :param end: Fin de la ventana consultada.
+    :param min_duration: timedelta con la duración mínima de un hueco.
+    :return: Lista de tuplas (inicio, fin) con los huecos libres.
+    """
+    slots = []
+    cursor = start
+    for booking_start, booking_end in bookings:
+        if booking_start > cursor and booking_start - cursor >= min_duration:
+            slots.append((cursor, min(booking_start, end)))
+        cursor = max(cursor, booking_end)
+        if cursor >= end:
+            return slots
+    if end > cursor and end - cursor >= min_duration:
+        slots.append((cursor, end))
+    return slots
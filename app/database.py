@@ -1,7 +1,10 @@
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import AsyncMongoClient
 import os
 from dotenv import load_dotenv
+from app import registry
+from app.services.metrics.metrics_service import METRICS_ENABLED, command_listener
+from app.services.profiler.profiler_service import slow_query_profiler
 
 # Cargar variables de entorno desde el archivo .env
 load_dotenv()
@@ -10,13 +13,77 @@ load_dotenv()
 MONGODB_URI = os.getenv("MONGODB_URI")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
 
-# Validar que las variables de entorno estén definidas
-if not MONGODB_URI or not DATABASE_NAME:
-    raise ValueError("Las variables de entorno MONGODB_URI y DATABASE_NAME deben estar definidas en el archivo .env")
+# Tamaño del pool de conexiones y timeouts (en milisegundos) configurables por entorno;
+# los timeouts que no se definan conservan el valor por defecto de pymongo
+MONGODB_CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGODB_MAX_POOL_SIZE", "100")),
+    "minPoolSize": int(os.getenv("MONGODB_MIN_POOL_SIZE", "0")),
+}
+for option, variable in (
+    ("connectTimeoutMS", "MONGODB_CONNECT_TIMEOUT_MS"),
+    ("socketTimeoutMS", "MONGODB_SOCKET_TIMEOUT_MS"),
+    ("serverSelectionTimeoutMS", "MONGODB_SERVER_SELECTION_TIMEOUT_MS"),
+    ("waitQueueTimeoutMS", "MONGODB_WAIT_QUEUE_TIMEOUT_MS"),
+):
+    if os.getenv(variable):
+        MONGODB_CLIENT_OPTIONS[option] = int(os.getenv(variable))
+# Tiempos y número de comandos para /metrics, y consultas lentas para /debug/slow-queries
+MONGODB_CLIENT_OPTIONS["event_listeners"] = []
+if METRICS_ENABLED:
+    MONGODB_CLIENT_OPTIONS["event_listeners"].append(command_listener)
+if slow_query_profiler:
+    MONGODB_CLIENT_OPTIONS["event_listeners"].append(slow_query_profiler)
 
-# Establecer la conexión con MongoDB
-client = MongoClient(MONGODB_URI)
-db = client[DATABASE_NAME]
+def _create_client() -> AsyncMongoClient:
+    # Validar que las variables de entorno estén definidas
+    if not MONGODB_URI or not DATABASE_NAME:
+        raise ValueError("Las variables de entorno MONGODB_URI y DATABASE_NAME deben estar definidas en el archivo .env")
+    # Establecer la conexión con MongoDB. El cliente asíncrono comparte el bucle de eventos
+    # de uvicorn, así que las consultas no bloquean al resto de peticiones.
+    client = AsyncMongoClient(MONGODB_URI, **MONGODB_CLIENT_OPTIONS)
+    if slow_query_profiler:
+        slow_query_profiler.attach(client)
+    return client
+
+registry.register("mongodb", _create_client, lambda client: client.close())
+
+def get_client() -> AsyncMongoClient:
+    return registry.get("mongodb")
+
+class LazyCollection:
+    """
+    Colección que se resuelve al usarla, para poder declarar colecciones a nivel de módulo
+    sin crear el cliente. Guarda la colección real mientras el cliente no cambie.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._client = None
+        self._collection = None
+
+    def _resolve(self):
+        client = get_client()
+        if client is not self._client:
+            self._collection = client[DATABASE_NAME][self.name]
+            self._client = client
+        return self._collection
+
+    def __getattr__(self, attribute: str):
+        return getattr(self._resolve(), attribute)
+
+class LazyDatabase:
+    def __init__(self):
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> LazyCollection:
+        if name not in self._collections:
+            self._collections[name] = LazyCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, attribute: str):
+        return getattr(get_client()[DATABASE_NAME], attribute)
+
+db = LazyDatabase()
 
 # Función para serializar documentos de MongoDB, convirtiendo ObjectId a string
 def serialize_doc(doc):
@@ -0,0 +1,63 @@
+import hashlib
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+from fastapi import Request, Response
+
+# Campos de control de versión que mantienen las rutas de escritura
+VERSION_FIELDS = ("version", "updated_at")
+
+def initial_version() -> dict:
+    return {"version": 1, "updated_at": datetime.now(timezone.utc)}
+
+def bump_version(update: dict) -> dict:
+    """
+    Añade a una actualización de MongoDB el incremento de versión y la fecha de cambio.
+    """
+    return {**update, "$inc": {"version": 1}, "$currentDate": {"updated_at": True}}
+
+def bump_version_stage() -> dict:
+    # Lo mismo que bump_version para las actualizaciones con pipeline de agregación
+    return {"$set": {"version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}, "updated_at": "$$NOW"}}
+
+def strip_version_fields(data: dict) -> dict:
+    # Las versiones solo las mantiene el servidor
+    for field in VERSION_FIELDS:
+        data.pop(field, None)
+    return data
+
+def document_etag(doc: dict) -> str:
+    return f'"{doc["_id"]}-{doc.get("version", 0)}"'
+
+def list_etag(docs: Iterable[dict]) -> str:
+    """
+    ETag de un listado a partir de la versión máxima del resultado más un resumen de los
+    pares (_id, version), sin serializar los documentos. El resumen cambia también cuando
+    entra o sale un documento del listado aunque la versión máxima no varíe.
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    count = 0
+    max_version = 0
+    for doc in docs:
+        version = doc.get("version", 0)
+        digest.update(f'{doc["_id"]}:{version};'.encode())
+        max_version = max(max_version, version)
+        count += 1
+    return f'"{count}-{max_version}-{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match usa comparación débil: se ignora el prefijo W/
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+def conditional_response(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """
+    Fija la cabecera ETag y, si el cliente ya tiene esa versión, devuelve una respuesta 304
+    sin cuerpo que la ruta debe devolver en lugar de serializar los documentos.
+    """
+    response.headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
@@ -0,0 +1,102 @@
+import asyncio
+import os
+from typing import Optional, Tuple
+from fastapi import Request, Response
+from starlette.types import Receive, Scope, Send
+from app.etag_utils import etag_matches
+
+# Los nombres de los blobs derivan de su contenido: una URL nunca cambia de contenido
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta una cabecera Range de un solo tramo (bytes=a-b, bytes=a- o bytes=-n) y
+    devuelve (inicio, fin) inclusivos. Sin cabecera, con varios tramos o con otra unidad
+    devuelve None y se sirve el fichero entero.
+
+    :raises ValueError: Si el tramo no es satisfacible (respuesta 416).
+    """
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        raise ValueError(range_header)
+    return start, end
+
+class FileRangeResponse(Response):
+    """
+    Envía un tramo de un fichero leyéndolo por bloques de chunk_size en un hilo, sin
+    tenerlo entero en memoria ni bloquear el bucle de eventos. No hay envío sin copia
+    (sendfile): uvicorn no ofrece la extensión ASGI http.response.zerocopysend ni acceso
+    al socket, así que cada bloque pasa por el proceso.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, start: int, end: int, status_code: int, headers: dict, media_type: str, send_body: bool = True):
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.count = end - start + 1
+        self.send_body = send_body
+        self.headers["content-length"] = str(self.count)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        file = await asyncio.to_thread(open, self.path, "rb")
+        try:
+            await asyncio.to_thread(file.seek, self.start)
+            remaining = self.count
+            while remaining:
+                chunk = await asyncio.to_thread(file.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": bool(remaining)})
+            if remaining:
+                # El fichero se acortó mientras se enviaba
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            await asyncio.to_thread(file.close)
+
+def file_response(request: Request, path: str, stat: os.stat_result, media_type: str, etag: str,
+                  cache_control: str = IMMUTABLE_CACHE_CONTROL) -> Response:
+    """
+    Respuesta para servir un fichero con ETag, Cache-Control y peticiones parciales:
+    304 si el cliente ya lo tiene, 206 para un tramo válido y 416 si el tramo no existe.
+    """
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = stat.st_size
+    send_body = request.method != "HEAD"
+    range_header = request.headers.get("range")
+    # If-Range: el tramo solo vale si el cliente lo pidió sobre esta misma versión
+    if_range = request.headers.get("if-range")
+    if if_range and if_range.strip() != etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if byte_range is None or size == 0:
+        if size == 0:
+            return Response(status_code=200, headers=headers, media_type=media_type)
+        return FileRangeResponse(path, 0, size - 1, 200, headers, media_type, send_body)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return FileRangeResponse(path, start, end, 206, headers, media_type, send_body)
@@ -1,32 +1,106 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
-from PIL import Image
+from typing import Dict, List, Optional, Sequence, Tuple
 from fastapi import UploadFile
-from typing import Optional
+from starlette.datastructures import Headers
 
-def create_thumbnail_from_upload(upload_file: UploadFile, size=(128, 128)) -> Optional[UploadFile]:
+# Tamaños (lado mayor en px) y formatos de las versiones que se generan de cada imagen
+IMAGE_RENDITION_SIZES = sorted(int(size) for size in os.getenv("IMAGE_RENDITION_SIZES", "128,512,1024").split(","))
+IMAGE_RENDITION_FORMATS = [fmt.strip().upper() for fmt in os.getenv("IMAGE_RENDITION_FORMATS", "WEBP,JPEG").split(",")]
+IMAGE_RENDITION_QUALITY = int(os.getenv("IMAGE_RENDITION_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(os.cpu_count() or 1)))
+
+CONTENT_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+EXTENSIONS = {"WEBP": ".webp", "JPEG": ".jpg", "PNG": ".png"}
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+def render_renditions(data: bytes, sizes: Sequence[int], formats: Sequence[str], quality: int) -> List[Tuple[int, str, bytes]]:
     """
-    Converts an uploaded file to a thumbnail and returns it as an UploadFile.
+    Genera todas las versiones de una imagen a partir de una sola decodificación.
+
+    Se ejecuta en un proceso del pool. En JPEG, draft() hace que el decodificador reduzca
+    la imagen a 1/2, 1/4 o 1/8 mientras la lee, sin bajar del tamaño mayor pedido, así que
+    una foto de cámara no se descomprime entera. Después se reduce de mayor a menor
+    reutilizando cada versión como origen de la siguiente.
 
-    :param upload_file: The uploaded file object (e.g., from a form or API).
-    :param size: Tuple indicating the size of the thumbnail, default is (128, 128).
-    :return: An UploadFile object representing the thumbnail, or None if an error occurs.
+    :return: Lista de tuplas (tamaño, formato, bytes codificados).
     """
+    from PIL import Image, ImageOps
+
+    largest = max(sizes)
+    image = Image.open(BytesIO(data))
+    image.draft("RGB", (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    renditions = []
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for image_format in formats:
+            # JPEG no admite canal alfa
+            output = image.convert("RGB") if image_format == "JPEG" and image.mode != "RGB" else image
+            buffer = BytesIO()
+            output.save(buffer, format=image_format, quality=quality)
+            renditions.append((size, image_format, buffer.getvalue()))
+    return renditions
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn evita heredar por fork los hilos del cliente de MongoDB
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+def is_image(upload_file: UploadFile) -> bool:
+    # Solo lee la cabecera: no decodifica la imagen
+    from PIL import Image, UnidentifiedImageError
+
     try:
-        # Open the uploaded file as an image
-        image_obj = Image.open(upload_file.file)
-        # Create a copy of the image to avoid modifying the original
-        thumbnail_img = image_obj.copy()
-        # Convert to thumbnail
-        thumbnail_img.thumbnail(size)
-        
-        # Save the thumbnail to a BytesIO object
-        img_byte_arr = BytesIO()
-        thumbnail_img.save(img_byte_arr, format='PNG')  # You can change the format if needed
-        img_byte_arr.seek(0)
-        
-        # Create a new UploadFile object from the BytesIO
-        return UploadFile(file=img_byte_arr, filename='thumbnail.png')  # You can change the filename as needed
-        
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
\ No newline at end of file
+        Image.open(upload_file.file)
+        return True
+    except UnidentifiedImageError:
+        return False
+    finally:
+        upload_file.file.seek(0)
+
+async def create_renditions(data: bytes,
+                            sizes: Sequence[int] = IMAGE_RENDITION_SIZES,
+                            formats: Sequence[str] = IMAGE_RENDITION_FORMATS) -> List[Tuple[int, str, UploadFile]]:
+    """
+    Converts an image into the configured set of renditions in the process pool.
+
+    :param data: Encoded image, for example an original downloaded again from blob storage.
+    :param sizes: Longest side in pixels of each rendition.
+    :param formats: Pillow format names to encode every size in.
+    :return: List of (size, format, UploadFile) tuples, largest size first.
+    :raises PIL.UnidentifiedImageError: If data is not a readable image.
+    """
+    renditions = await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), render_renditions, data, list(sizes), list(formats), IMAGE_RENDITION_QUALITY
+    )
+    return [
+        (size, image_format, UploadFile(
+            file=BytesIO(content),
+            filename=f"{size}{EXTENSIONS.get(image_format, '')}",
+            headers=Headers({"content-type": CONTENT_TYPES.get(image_format, "application/octet-stream")})
+        ))
+        for size, image_format, content in renditions
+    ]
+
+def rendition_urls(uploaded: List[Tuple[int, str, str]]) -> Dict[str, Dict[str, str]]:
+    # {"128": {"webp": url, "jpeg": url}, ...}
+    urls: Dict[str, Dict[str, str]] = {}
+    for size, image_format, url in uploaded:
+        urls.setdefault(str(size), {})[image_format.lower()] = url
+    return urls
@@ -0,0 +1,99 @@
+import logging
+import os
+from typing import List
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Con INDEXES_STRICT (por defecto) falta cualquier índice de INDEXES y la aplicación no
+# arranca; sin él solo se avisa, salvo para los de REQUIRED_INDEXES, que siempre lo impiden
+INDEXES_STRICT = os.getenv("INDEXES_STRICT", "true").lower() in ("1", "true", "yes")
+# Sin el de solapamiento cada reserva recorre la colección entera bajo el cerrojo del recurso
+REQUIRED_INDEXES = {"assignments.resource_id_start_time_end_time", "assignments.resource_id_end_time_start_time"}
+
+class MissingIndexesError(RuntimeError):
+    """Faltan índices de los que dependen las rutas."""
+
+# Índices de los que dependen las consultas de las rutas, por colección
+INDEXES = {
+    "assignments": [
+        # Consultas de solapamiento: igualdad en resource_id y rango en start_time / end_time.
+        # Con end_time primero el rango end_time > inicio solo recorre las reservas que
+        # terminan después del hueco pedido (las futuras, en la práctica), no el historial;
+        # el orden start_time primero sirve a las consultas sobre fechas pasadas y a free-slots.
+        ([("resource_id", ASCENDING), ("start_time", ASCENDING), ("end_time", ASCENDING)],
+         {"name": "resource_id_start_time_end_time"}),
+        ([("resource_id", ASCENDING), ("end_time", ASCENDING), ("start_time", ASCENDING)],
+         {"name": "resource_id_end_time_start_time"}),
+        # Paginación por cursor de get_bookings en orden (start_time, _id), con y sin filtros
+        ([("start_time", ASCENDING), ("_id", ASCENDING)], {"name": "start_time_id"}),
+        ([("resource_id", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+         {"name": "resource_id_start_time_id"}),
+        ([("account_id", ASCENDING), ("start_time", ASCENDING), ("_id", ASCENDING)],
+         {"name": "account_id_start_time_id"}),
+    ],
+    "accounts": [
+        # Filtro por account_type sin distinguir mayúsculas (misma collation que las consultas)
+        ([("account_type", ASCENDING), ("_id", ASCENDING)],
+         {"name": "account_type_id_ci", "collation": {"locale": "en", "strength": 2}}),
+        # Login y comprobación de duplicados en create_account
+        ([("username", ASCENDING)], {"name": "username"}),
+        ([("email", ASCENDING)], {"name": "email"}),
+    ],
+    "resources": [
+        # Listado por cuenta paginado en orden de _id
+        ([("account_id", ASCENDING), ("_id", ASCENDING)], {"name": "account_id_id"}),
+    ],
+    "jobs": [
+        # Siguiente trabajo disponible de la cola
+        ([("status", ASCENDING), ("available_at", ASCENDING)], {"name": "status_available_at"}),
+    ],
+    "blob_refs": [
+        # Referencias de un recurso al borrarlo
+        ([("owners", ASCENDING)], {"name": "owners"}),
+    ],
+}
+
+async def ensure_indexes(database):
+    """
+    Crea los índices declarados en INDEXES. create_index es idempotente, por lo que
+    puede ejecutarse en cada arranque. Un índice que no se puede crear (por ejemplo, uno
+    equivalente con otras opciones) no detiene la creación del resto; si no existe
+    ninguno equivalente, verify_indexes impide arrancar.
+    """
+    for collection_name, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await database[collection_name].create_index(keys, **options)
+            except OperationFailure as e:
+                logger.warning("No se pudo crear el índice %s de %s: %s", options["name"], collection_name, e)
+
+def _index_matches(declared_keys: list, options: dict, existing: dict) -> bool:
+    # Vale cualquier índice con las mismas claves y collation, se llame como se llame
+    return (list(existing["key"].items()) == [tuple(key) for key in declared_keys]
+            and (existing.get("collation") or {}).get("locale") == (options.get("collation") or {}).get("locale")
+            and (existing.get("collation") or {}).get("strength") == (options.get("collation") or {}).get("strength"))
+
+async def verify_indexes(database, strict: bool = INDEXES_STRICT) -> List[str]:
+    """
+    Comprueba que existe cada índice de INDEXES: sin ellos las rutas que los usan recorren
+    la colección entera.
+
+    :param strict: Si falta alguno se lanza la excepción; si es False solo se avisa, salvo
+        para los de REQUIRED_INDEXES.
+    :return: Nombres colección.índice de los índices que faltan.
+    :raises MissingIndexesError: Si faltan índices que impiden arrancar.
+    """
+    missing = []
+    for collection_name, indexes in INDEXES.items():
+        existing = [index async for index in await database[collection_name].list_indexes()]
+        for keys, options in indexes:
+            if not any(_index_matches(keys, options, index) for index in existing):
+                missing.append(f"{collection_name}.{options['name']}")
+    for name in missing:
+        logger.warning("Falta el índice %s", name)
+    blocking = missing if strict else [name for name in missing if name in REQUIRED_INDEXES]
+    if blocking:
+        raise MissingIndexesError(f"Faltan los índices {', '.join(blocking)}; revise los avisos de ensure_indexes")
+    return missing
@@ -0,0 +1,55 @@
+from typing import Any, Iterable, Optional, Type
+import orjson
+from bson import ObjectId
+from fastapi import Response
+from pydantic import BaseModel
+
+def json_default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Tipo no serializable: {type(value).__name__}")
+
+class ResponseShape:
+    """
+    Campos del response_model de una ruta, para escribir documentos de MongoDB sin
+    validarlos con Pydantic pero con el mismo cuerpo que declara el esquema OpenAPI.
+
+    projection lee solo esos campos (más extra_fields, por ejemplo la versión para el
+    ETag); to_json descarta cualquier otra clave del documento, renombra _id a id y
+    rellena los valores por defecto del modelo para los campos que no estén guardados.
+    """
+
+    def __init__(self, model: Type[BaseModel], *extra_fields: str):
+        self.fields = [name for name in model.model_fields if name != "id"]
+        self.projection = {field: 1 for field in [*self.fields, *extra_fields]}
+        self.defaults = {name: field.default for name, field in model.model_fields.items()
+                         if name != "id" and not field.is_required()}
+
+    def to_json(self, doc: dict, fields: Optional[Iterable[str]] = None) -> dict:
+        """
+        :param fields: Subconjunto de campos pedido por el cliente; por defecto todos.
+        """
+        result = {"id": doc["_id"]} if "_id" in doc else {}
+        for field in self.fields if fields is None else fields:
+            if field in doc:
+                result[field] = doc[field]
+            elif field in self.defaults:
+                result[field] = self.defaults[field]
+        return result
+
+class BSONJSONResponse(Response):
+    """
+    Respuesta JSON que escribe los documentos de MongoDB directamente a bytes con orjson.
+
+    Al devolverla desde una ruta, FastAPI no vuelve a validar el contenido contra el
+    response_model; se usa solo con documentos que salen de la base de datos.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=json_default)
+
+def bson_json_response(content: Any, response: Optional[Response] = None) -> BSONJSONResponse:
+    # Las cabeceras fijadas en la Response inyectada (ETag, X-Next-Cursor) se copian a la nueva
+    headers = dict(response.headers) if response is not None else None
+    return BSONJSONResponse(content=content, headers=headers)
@@ -1,12 +1,48 @@
+import logging
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import uvicorn
-from app.routes import assignments, resources, accounts
+from app import registry
+from app.database import db, get_client
+from app.indexes import ensure_indexes, verify_indexes
+from app.pagination_utils import NEXT_CURSOR_HEADER
+from app import image_utils
+from app.routes import assignments, resources, accounts, debug, metrics
+from app.services.blob import blob_service
+from app.services.blob_gc import blob_gc_service
+from app.services.image_processing import image_processing_service  # registra sus trabajos
+from app.services.invalidation import invalidation_service
+from app.services.jobs import jobs_service
+from app.services.metrics.metrics_service import METRICS_ENABLED, MetricsMiddleware
+from app.services.password import password_service
+
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Los clientes externos se crean aquí y no al importar; MongoDB se crea ya para que
+    # una configuración incorrecta detenga el arranque
+    get_client()
+    # Garantizar que los índices que usan las rutas existan antes de atender peticiones
+    await ensure_indexes(db)
+    await verify_indexes(db)
+    jobs_service.start()
+    blob_gc_service.start()
+    invalidation_service.start()
+    yield
+    await invalidation_service.stop()
+    await blob_gc_service.stop()
+    await jobs_service.stop()
+    password_service.shutdown()
+    image_utils.shutdown()
+    await registry.close_all()
 
 app = FastAPI(
     title="API para la aplicación Reservify",
     description="Una API para manejar usuarios, recursos y reservas usando FastAPI y MongoDB.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -15,12 +51,21 @@ app.add_middleware(
     allow_credentials=True,  # Permitir cookies y encabezados de autenticación
     allow_methods=["*"],  # Permitir todos los métodos HTTP (GET, POST, etc.)
     allow_headers=["*"],  # Permitir todos los encabezados
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag"],  # Cabeceras de paginación y caché visibles para el navegador
 )
+# Latencia por ruta y comandos de MongoDB por petición, expuestos en /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 
 # Incluir las rutas de cada módulo
 app.include_router(accounts.router)
 app.include_router(resources.router)
 app.include_router(assignments.router)
+app.include_router(debug.router)
+app.include_router(metrics.router)
+if blob_service.BLOB_BACKEND == "local":
+    from app.routes import blobs
+    app.include_router(blobs.router)
 
 # Ruta raíz
 @app.get("/")
@@ -29,4 +74,5 @@ def read_root():
 
 # Para ejecutar con `python main.py`
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
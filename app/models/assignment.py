@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, validator
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
 
@@ -55,6 +55,37 @@ class AssignmentResponse(BaseModel):
             }
         }
 
+class FreeSlot(BaseModel):
+    start_time: datetime
+    end_time: datetime
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "start_time": "2024-05-01T12:00:00",
+                "end_time": "2024-05-01T15:30:00"
+            }
+        }
+
+class ImportRowError(BaseModel):
+    row: int
+    detail: str
+
+class ImportResult(BaseModel):
+    inserted: int
+    errors: List[ImportRowError]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "inserted": 9998,
+                "errors": [
+                    {"row": 17, "detail": "Recurso no encontrado"},
+                    {"row": 42, "detail": "La reserva se solapa con una existente para este recurso"}
+                ]
+            }
+        }
+
 class UpdateAssignment(BaseModel):
     id: str
     account_id: Optional[str] = Field(None, example="60d5ec49f8d4b45f8c1e4e7a")
@@ -1,6 +1,5 @@
-from numpy import double
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 from bson import ObjectId
 
 class Resource(BaseModel):
@@ -36,6 +35,8 @@ class ResourceResponse(BaseModel):
     notes: List[str]
     thumbnailUrl: str
     rawImagesUrls: List[str]
+    renditions: Optional[Dict[str, Dict[str, str]]] = None
+    processing_status: Optional[str] = Field(None, example="processing")
     price_per_day: float
 
     class Config:
@@ -0,0 +1,66 @@
+import base64
+from typing import List, Optional, Tuple
+from bson import json_util
+from fastapi import HTTPException, Response
+
+# Cabecera con el cursor de la página siguiente en los listados
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Ordenaciones estables de los listados; la última clave siempre es _id para desempatar
+ID_SORT = [("_id", 1)]
+START_TIME_SORT = [("start_time", 1), ("_id", 1)]
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor inválido")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="cursor inválido")
+    return values
+
+def keyset_query(sort: List[Tuple[str, int]], values: list) -> dict:
+    """
+    Filtro que selecciona los documentos posteriores a values en el orden sort, por
+    ejemplo para (start_time, _id): start_time > t OR (start_time == t AND _id > id).
+    """
+    if len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="cursor inválido")
+    branches = []
+    for position, (field, direction) in enumerate(sort):
+        branch = {previous: values[index] for index, (previous, _) in enumerate(sort[:position])}
+        branch[field] = {"$gt" if direction == 1 else "$lt": values[position]}
+        branches.append(branch)
+    return branches[0] if len(branches) == 1 else {"$or": branches}
+
+async def paginate(collection, query: dict, sort: List[Tuple[str, int]], skip: int, limit: int,
+                   cursor: Optional[str] = None, projection: Optional[dict] = None,
+                   collation: Optional[dict] = None) -> Tuple[List[dict], Optional[str]]:
+    """
+    Devuelve una página de documentos y el cursor de la siguiente.
+
+    Con cursor la página empieza justo después del último documento de la anterior usando
+    el índice de sort, en lugar de recorrer los documentos saltados como hace skip; skip se
+    mantiene para los clientes que todavía no usan cursores.
+    """
+    if cursor:
+        query = {"$and": [query, keyset_query(sort, decode_cursor(cursor))]} if query else keyset_query(sort, decode_cursor(cursor))
+    documents = collection.find(query, projection).sort(sort)
+    if collation:
+        documents = documents.collation(collation)
+    if skip and not cursor:
+        documents = documents.skip(skip)
+    docs = [doc async for doc in documents.limit(limit)]
+
+    next_cursor = None
+    if limit and len(docs) == limit:
+        next_cursor = encode_cursor([docs[-1][field] for field, _ in sort])
+    return docs, next_cursor
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
@@ -0,0 +1,32 @@
+import inspect
+from typing import Any, Callable, Dict, Optional
+
+# Clientes externos (MongoDB, almacén de imágenes) por nombre. Cada uno se crea la primera
+# vez que se pide y se cierra en el lifespan de la aplicación, así importar los módulos no
+# abre conexiones ni exige su configuración
+_factories: Dict[str, Callable[[], Any]] = {}
+_closers: Dict[str, Optional[Callable[[Any], Any]]] = {}
+_instances: Dict[str, Any] = {}
+
+def register(name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], Any]] = None):
+    """
+    Declara cómo crear y cerrar un cliente. close puede devolver una corrutina.
+    """
+    _factories[name] = factory
+    _closers[name] = close
+
+def get(name: str) -> Any:
+    instance = _instances.get(name)
+    if instance is None:
+        instance = _instances[name] = _factories[name]()
+    return instance
+
+async def close_all():
+    # En orden inverso al de creación; un cliente cerrado se vuelve a crear si se pide otra vez
+    for name in reversed(list(_instances)):
+        instance = _instances.pop(name)
+        close = _closers[name]
+        if close is not None:
+            result = close(instance)
+            if inspect.isawaitable(result):
+                await result
@@ -1,10 +1,13 @@
-from fastapi import APIRouter, HTTPException, Query, status, Depends
+from fastapi import APIRouter, HTTPException, Query, Response, status, Depends
 from pydantic import BaseModel
 from app.database import db, serialize_doc
+from app.json_utils import ResponseShape, bson_json_response
+from app.pagination_utils import ID_SORT, paginate, set_next_cursor
 from bson.objectid import ObjectId
 from typing import List, Optional
-from passlib.context import CryptContext
 from app.models.account import AccountResponse, ClientAccountResponse, CompanyAccountResponse, UpdateAccount, Account
+from app.services.cache.cache_service import accounts_cache, get_account_doc
+from app.services.password.password_service import hash_password, verify_password
 
 router = APIRouter(
     prefix="/accounts",
@@ -17,55 +20,92 @@ class AccountLogin(BaseModel):
 
 collection = db["accounts"]
 
-# Configurar el contexto para el hashing de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Comparación de account_type sin distinguir mayúsculas; el índice de app/indexes.py usa la misma
+ACCOUNT_TYPE_COLLATION = {"locale": "en", "strength": 2}
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+# Proyecciones explícitas: el hash de la contraseña solo se lee en el login
+ACCOUNT_PROJECTION = {"password": 0}
+ACCOUNT_SHAPE = ResponseShape(AccountResponse)
+COMPANY_SHAPE = ResponseShape(CompanyAccountResponse)
+LOGIN_PROJECTION = {**{field: 1 for field in AccountResponse.model_fields if field != "id"}, "password": 1}
 
-def verify_password(plain_password, hashed_password):
-    return True #pwd_context.verify(plain_password, hashed_password)
+# Campos que un cliente puede pedir con el parámetro fields
+SELECTABLE_FIELDS = set(AccountResponse.model_fields)
+
+FIELDS_QUERY = Query(None, description="Campos a devolver separados por comas, por ejemplo: id,name,thumbnailUrl")
+
+def get_requested_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    requested = {field.strip() for field in fields.split(",") if field.strip()}
+    unknown = requested - SELECTABLE_FIELDS
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Campos no válidos: {', '.join(sorted(unknown))}")
+    return [field for field in ACCOUNT_SHAPE.fields if field in requested]
+
+def get_fields_projection(requested: Optional[List[str]]) -> dict:
+    if requested is None:
+        return ACCOUNT_SHAPE.projection
+    return {field: 1 for field in requested} or {"_id": 1}
 
 @router.post("/login", response_model=AccountResponse)
 async def login(account: AccountLogin):
     # Buscar el usuario en la base de datos
-    db_account = collection.find_one({"username": account.username})
+    db_account = await collection.find_one({"username": account.username}, LOGIN_PROJECTION)
     
-    if db_account is None or not verify_password(account.password, db_account["password"]):
+    if db_account is None:
         raise HTTPException(status_code=400, detail="Credenciales inválidas")
+    is_valid, new_hash = await verify_password(account.password, db_account.pop("password"))
+    if not is_valid:
+        raise HTTPException(status_code=400, detail="Credenciales inválidas")
+    if new_hash:
+        # El coste de bcrypt cambió desde que se guardó el hash: se actualiza de forma transparente
+        await collection.update_one({"_id": db_account["_id"]}, {"$set": {"password": new_hash}})
 
     return serialize_doc(db_account)
 
 @router.post("/", response_model=AccountResponse, status_code=status.HTTP_201_CREATED)
-def create_account(account: Account):
+async def create_account(account: Account):
     # Verificar si el username o email ya existen
-    if collection.find_one({"username": account.username}):
+    if await collection.find_one({"username": account.username}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Username ya existe")
-    if collection.find_one({"email": account.email}):
+    if await collection.find_one({"email": account.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email ya existe")
     
     account_dict = account.dict()
     # Hashear la contraseña antes de almacenarla
-    account_dict["password"] = get_password_hash(account_dict["password"])
-    result = collection.insert_one(account_dict)
-    created_account = collection.find_one({"_id": result.inserted_id})
+    account_dict["password"] = await hash_password(account_dict["password"])
+    result = await collection.insert_one(account_dict)
+    created_account = await collection.find_one({"_id": result.inserted_id}, ACCOUNT_PROJECTION)
     return serialize_doc(created_account)
 
 @router.get("/", response_model=List[AccountResponse])
-def get_accounts(skip: int = 0, limit: int = 10, id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b")):
+async def get_accounts(response: Response, skip: int = 0, limit: int = 10, id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b"),
+                       cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor de la página anterior"),
+                       account_type: Optional[str] = Query(None, example="company"),
+                       fields: Optional[str] = FIELDS_QUERY):
     
-    if not id:
-        accounts = collection.find().skip(skip).limit(limit)
-        return [serialize_doc(account) for account in accounts]
-
-    query = {"_id": ObjectId(id)}
-    accounts = collection.find(query).skip(skip).limit(limit)
-    return [serialize_doc(account) for account in accounts]
+    query = {"_id": ObjectId(id)} if id else {}
+    if account_type:
+        query["account_type"] = account_type
+    requested = get_requested_fields(fields)
+    accounts, next_cursor = await paginate(collection, query, ID_SORT, skip, limit, cursor,
+                                           get_fields_projection(requested),
+                                           collation=ACCOUNT_TYPE_COLLATION if account_type else None)
+    set_next_cursor(response, next_cursor)
+    # Los documentos vienen proyectados de la base de datos: se escriben sin revalidar, lo
+    # que además permite devolver solo los campos pedidos con fields
+    return bson_json_response([ACCOUNT_SHAPE.to_json(account, requested) for account in accounts], response)
     
 
 @router.get("/clients/{account_id}", response_model=ClientAccountResponse)
-def get_client(account_id: str):
-    account = get_account(account_id)
+async def get_client(account_id: str):
+    if not ObjectId.is_valid(account_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+    account = await get_account_doc(account_id)
+    if not account:
+        raise HTTPException(status_code=404, detail="Usuario no encontrado")
+    account = serialize_doc(account)
     type: str = account["account_type"]
     if type.lower() != "client":
         raise HTTPException(status_code=400, detail="Not a Client")
@@ -77,38 +117,38 @@ def get_client(account_id: str):
     return client
 
 @router.get("/{account_id}", response_model=AccountResponse)
-def get_account(account_id: str):
+async def get_account(account_id: str, fields: Optional[str] = FIELDS_QUERY):
     if not ObjectId.is_valid(account_id):
         raise HTTPException(status_code=400, detail="ID inválido")
-    account = collection.find_one({"_id": ObjectId(account_id)})
+    requested = get_requested_fields(fields)
+    if requested is not None:
+        account = await collection.find_one({"_id": ObjectId(account_id)}, get_fields_projection(requested))
+    else:
+        account = await get_account_doc(account_id)
     if account:
-        return serialize_doc(account)
+        return bson_json_response(ACCOUNT_SHAPE.to_json(account, requested))
     else:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
 @router.get("/companies/", response_model=List[CompanyAccountResponse])
-def get_companies(skip: int = 0, limit: int = 10, id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b")):     
-    accounts = get_accounts(skip, limit, id)
-    companies = []
-    for account in accounts:
-        type: str = account["account_type"]
-        if type.lower() != "company":
-            continue
-        company = {
-            "id": account["id"],
-            "name": account["name"],
-            "email": account["email"],
-            "thumbnailUrl": account["thumbnailUrl"]
-        }
-        companies.append(company)
+async def get_companies(response: Response, skip: int = 0, limit: int = 10, id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b"),
+                        cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor de la página anterior")):     
+    # El filtro por tipo se resuelve en MongoDB, así que las páginas llegan completas
+    query = {"account_type": "company"}
+    if id:
+        query["_id"] = ObjectId(id)
+    accounts, next_cursor = await paginate(collection, query, ID_SORT, skip, limit, cursor,
+                                           COMPANY_SHAPE.projection, collation=ACCOUNT_TYPE_COLLATION)
+    set_next_cursor(response, next_cursor)
+    companies = [COMPANY_SHAPE.to_json(account) for account in accounts]
         
     if companies.__len__() == 0:
         raise HTTPException(status_code=400, detail="No companies found")
-    return companies
+    return bson_json_response(companies, response)
         
 
 @router.put("/{account_id}", response_model=AccountResponse)
-def update_account(account_id: str, account: UpdateAccount):
+async def update_account(account_id: str, account: UpdateAccount):
     if not ObjectId.is_valid(account_id):
         raise HTTPException(status_code=400, detail="ID inválido")
     
@@ -116,25 +156,27 @@ def update_account(account_id: str, account: UpdateAccount):
     
     if 'password' in update_data:
         # Hashear la nueva contraseña
-        update_data['password'] = get_password_hash(update_data['password'])
+        update_data['password'] = await hash_password(update_data['password'])
     
     if not update_data:
         raise HTTPException(status_code=400, detail="No hay datos para actualizar")
     
-    result = collection.update_one({"_id": ObjectId(account_id)}, {"$set": update_data})
+    result = await collection.update_one({"_id": ObjectId(account_id)}, {"$set": update_data})
+    accounts_cache.invalidate(account_id)
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
-    updated_account = collection.find_one({"_id": ObjectId(account_id)})
+    updated_account = await collection.find_one({"_id": ObjectId(account_id)}, ACCOUNT_PROJECTION)
     return serialize_doc(updated_account)
 
 @router.delete("/{account_id}", response_model=dict)
-def delete_account(account_id: str):
+async def delete_account(account_id: str):
     if not ObjectId.is_valid(account_id):
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    result = collection.delete_one({"_id": ObjectId(account_id)})
+    result = await collection.delete_one({"_id": ObjectId(account_id)})
+    accounts_cache.invalidate(account_id)
     
     if result.deleted_count == 1:
         return {"detail": "Usuario eliminado exitosamente"}
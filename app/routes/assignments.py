@@ -1,12 +1,22 @@
 from ast import parse
-from fastapi import APIRouter, HTTPException, status, Query
-from app.assignement_utils import get_overlapping_query
-from app.models.assignment import Assignment, AssignmentResponse, UpdateAssignment
+import io
+from fastapi import APIRouter, File, HTTPException, status, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from app.assignement_utils import DATE_FORMAT, get_free_slots, get_overlapping_query
+from app.models.assignment import Assignment, AssignmentResponse, FreeSlot, ImportResult, UpdateAssignment
 from app.database import db, serialize_doc
+from app.json_utils import ResponseShape, bson_json_response
+from app.etag_utils import bump_version, conditional_response, document_etag, initial_version, list_etag
+from app.pagination_utils import START_TIME_SORT, paginate, set_next_cursor
+from app.services.availability.availability_service import availability_engine, get_max_duration, record_durations, to_naive_utc
+from app.services.cache.cache_service import get_account_doc, get_resource_doc
+from app.services.bulk_import.bulk_import_service import detect_format, import_assignments, parse_rows
+from app.services.export.export_service import EXPORT_BATCH_SIZE, EXPORT_PROJECTION, MEDIA_TYPES, export_documents
+from app.services.reservation.reservation_service import ResourceLockError, resource_lock
 from bson import ObjectId
 from bson.objectid import ObjectId
-from typing import List, Optional
-from datetime import datetime
+from typing import Dict, List, Optional
+from datetime import datetime, timedelta
 
 router = APIRouter(
     prefix="/assignments",
@@ -14,73 +24,96 @@ router = APIRouter(
 )
 
 collection = db["assignments"]
-accounts_collection = db["accounts"]
 resources_collection = db["resources"]
 
-def is_overlapping(resource_id: str, start_time: datetime, end_time: datetime, exclude_id: Optional[str] = None) -> bool:
+# La versión solo se lee para el ETag; no forma parte de la respuesta
+ASSIGNMENT_SHAPE = ResponseShape(AssignmentResponse, "version")
+
+# Estados que ocupan el recurso al comprobar disponibilidad
+ACTIVE_STATUSES = ["pending", "active"]
+
+RESOURCE_BUSY_DETAIL = "El recurso tiene otra reserva en curso, inténtelo de nuevo"
+
+async def is_overlapping(resource_id: str, start_time: datetime, end_time: datetime, exclude_id: Optional[str] = None) -> bool:
+    # Se usa bajo el cerrojo del recurso antes de escribir: siempre se pregunta a MongoDB.
+    # El motor de disponibilidad de este worker puede no haber visto aún una reserva que
+    # otro worker guardó justo antes de soltar el cerrojo; solo responde las consultas
+    # de solo lectura como check_availability.
     query = {
         "resource_id": ObjectId(resource_id),
-        "$or": get_overlapping_query(start_time, end_time)
+        **get_overlapping_query(start_time, end_time, await get_max_duration(resource_id))
     }
     if exclude_id:
         query["_id"] = {"$ne": ObjectId(exclude_id)}
-    overlapping = collection.find_one(query)
+    overlapping = await collection.find_one(query, {"_id": 1})
     return overlapping is not None
 
 @router.post("/", response_model=AssignmentResponse, status_code=status.HTTP_201_CREATED)
-def create_assignment(assignment: Assignment):
+async def create_assignment(assignment: Assignment):
     # Validar account_id
     if not ObjectId.is_valid(assignment.account_id):
         raise HTTPException(status_code=400, detail="account_id inválido")
-    account = accounts_collection.find_one({"_id": ObjectId(assignment.account_id)})
+    account = await get_account_doc(assignment.account_id)
     if not account:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     # Validar resource_id
     if not ObjectId.is_valid(assignment.resource_id):
         raise HTTPException(status_code=400, detail="resource_id inválido")
-    resource = resources_collection.find_one({"_id": ObjectId(assignment.resource_id)})
+    resource = await get_resource_doc(assignment.resource_id)
     if not resource:
         raise HTTPException(status_code=404, detail="Recurso no encontrado")
     
-
-    
-    # Validar que no haya reservas superpuestas
-    if is_overlapping(assignment.resource_id, assignment.start_time, assignment.end_time):
-        raise HTTPException(status_code=400, detail="La reserva se solapa con una existente para este recurso")
-    
-    assignment_dict = assignment.dict()
     assignment_dict = assignment.dict()
     assignment_dict['status'] = 'pending'
+    assignment_dict.update(initial_version())
     assignment_dict['account_id'] = ObjectId(assignment_dict['account_id'])
     assignment_dict['resource_id'] = ObjectId(assignment_dict['resource_id'])
-    result = collection.insert_one(assignment_dict)
-    created_assignment = collection.find_one({"_id": result.inserted_id})
-    return serialize_doc(created_assignment)
 
-@router.get("/")
-async def get_bookings(
-    start_date: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a"),
-    end_date: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a"), 
-    skip: int = 0,
-    limit: int = 10,
-    account_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a"),
-    resource_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b"),
+    # La comprobación de solapamiento y la inserción van bajo el cerrojo del recurso para
+    # que dos peticiones simultáneas por el mismo hueco no pasen ambas la comprobación
+    try:
+        async with resource_lock(assignment.resource_id) as lock:
+            if await is_overlapping(assignment.resource_id, assignment.start_time, assignment.end_time):
+                raise HTTPException(status_code=400, detail="La reserva se solapa con una existente para este recurso")
+            await record_durations({assignment_dict['resource_id']: assignment.end_time - assignment.start_time})
+            # Solo queda guardada si el cerrojo siguió siendo de esta petición durante la escritura
+            result = await lock.write(lambda: collection.insert_one(assignment_dict),
+                                      lambda result: collection.delete_one({"_id": result.inserted_id}))
+            created_assignment = await collection.find_one({"_id": result.inserted_id})
+            if availability_engine:
+                availability_engine.add(created_assignment)
+    except ResourceLockError:
+        raise HTTPException(status_code=409, detail=RESOURCE_BUSY_DETAIL)
+    return serialize_doc(created_assignment)
 
-    ) -> List[AssignmentResponse]:
+@router.post("/import/", response_model=ImportResult)
+async def import_assignments_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$", description="Por defecto según la extensión del fichero")
+):
     """
-    Get all bookings for a specific resource and date
+    Bulk import bookings from an NDJSON or CSV file, reporting errors per row
     """
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        return await import_assignments(parse_rows(stream, format or detect_format(file.filename)))
+    finally:
+        stream.detach()
+
+def get_bookings_query(start_date: Optional[str], end_date: Optional[str],
+                       account_id: Optional[str], resource_id: Optional[str]) -> dict:
+    # Filtros comunes al listado y a la exportación
     query = {}
     
     if start_date and end_date:
         try:
-            start = datetime.strptime(start_date, "%Y-%m-%dT%H:%M:%S.%fZ")
-            end = datetime.strptime(end_date, "%Y-%m-%dT%H:%M:%S.%fZ")
+            start = datetime.strptime(start_date, DATE_FORMAT)
+            end = datetime.strptime(end_date, DATE_FORMAT)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format")
         
-        query["$or"] = get_overlapping_query(start, end)
+        query.update(get_overlapping_query(start, end))
     
     if account_id:
         if not ObjectId.is_valid(account_id):
@@ -90,30 +123,109 @@ async def get_bookings(
         if not ObjectId.is_valid(resource_id):
             raise HTTPException(status_code=400, detail="resource_id inválido")
         query["resource_id"] = ObjectId(resource_id)
-    
-    
+    return query
 
-    assignments = collection.find(query).skip(skip).limit(limit)
+@router.get("/")
+async def get_bookings(
+    request: Request,
+    response: Response,
+    start_date: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a"),
+    end_date: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a"), 
+    skip: int = 0,
+    limit: int = 10,
+    account_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a"),
+    resource_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b"),
+    cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor de la página anterior"),
+    ) -> List[AssignmentResponse]:
+    """
+    Get all bookings for a specific resource and date
+    """
+    query = get_bookings_query(start_date, end_date, account_id, resource_id)
+
+    assignments, next_cursor = await paginate(collection, query, START_TIME_SORT, skip, limit, cursor,
+                                              ASSIGNMENT_SHAPE.projection)
+    set_next_cursor(response, next_cursor)
+    not_modified = conditional_response(request, response, list_etag(assignments))
+    if not_modified:
+        return not_modified
     
-    return [serialize_doc(booking) for booking in assignments]
+    return bson_json_response([ASSIGNMENT_SHAPE.to_json(booking) for booking in assignments], response)
+
+@router.get("/export")
+async def export_bookings(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start_date: Optional[str] = Query(None, example="2024-05-01T00:00:00.000Z"),
+    end_date: Optional[str] = Query(None, example="2024-06-01T00:00:00.000Z"),
+    account_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a"),
+    resource_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b"),
+):
+    """
+    Export every booking matching the filters of get_bookings as NDJSON or CSV in a single streamed response
+    """
+    query = get_bookings_query(start_date, end_date, account_id, resource_id)
+    # Un solo cursor del servidor en el orden de los índices de get_bookings
+    bookings = collection.find(query, EXPORT_PROJECTION, batch_size=EXPORT_BATCH_SIZE).sort(START_TIME_SORT)
+    return StreamingResponse(
+        export_documents(bookings, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="bookings.{format}"'}
+    )
+
+
+@router.get("/free-slots", response_model=List[FreeSlot])
+async def get_resource_free_slots(
+    resource_id: str,
+    from_time: str = Query(..., alias="from", example="2024-05-01T08:00:00.000Z"),
+    to_time: str = Query(..., alias="to", example="2024-05-01T20:00:00.000Z"),
+    min_duration: int = Query(0, ge=0, description="Duración mínima del hueco en minutos")
+):
+    """
+    Get the free slots of a resource inside a time window with a single range scan
+    """
+    if not ObjectId.is_valid(resource_id):
+        raise HTTPException(status_code=400, detail="resource_id inválido")
+    try:
+        start = datetime.strptime(from_time, DATE_FORMAT)
+        end = datetime.strptime(to_time, DATE_FORMAT)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {ve}")
+
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Start time must be before end time")
+
+    bookings = collection.find(
+        {
+            "resource_id": ObjectId(resource_id),
+            "status": {"$in": ACTIVE_STATUSES},
+            **get_overlapping_query(start, end, await get_max_duration(resource_id))
+        },
+        {"_id": 0, "start_time": 1, "end_time": 1}
+    ).sort("start_time", 1)
+    intervals = [(booking["start_time"], booking["end_time"]) async for booking in bookings]
+
+    slots = get_free_slots(intervals, start, end, timedelta(minutes=min_duration))
+    return [{"start_time": slot_start, "end_time": slot_end} for slot_start, slot_end in slots]
 
 
 @router.get("/{assignment_id}", response_model=AssignmentResponse)
-def get_assignment(assignment_id: str):
+async def get_assignment(assignment_id: str, request: Request, response: Response):
     if not ObjectId.is_valid(assignment_id):
         raise HTTPException(status_code=400, detail="ID inválido")
-    assignment = collection.find_one({"_id": ObjectId(assignment_id)})
+    assignment = await collection.find_one({"_id": ObjectId(assignment_id)}, ASSIGNMENT_SHAPE.projection)
     if assignment:
-        return serialize_doc(assignment)
+        not_modified = conditional_response(request, response, document_etag(assignment))
+        if not_modified:
+            return not_modified
+        return bson_json_response(ASSIGNMENT_SHAPE.to_json(assignment), response)
     else:
         raise HTTPException(status_code=404, detail="Asignación no encontrada")
 
 @router.put("/", response_model=AssignmentResponse)
-def update_assignment(assignment: UpdateAssignment):
+async def update_assignment(assignment: UpdateAssignment):
     if not ObjectId.is_valid(assignment.id):
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    existing_assignment = collection.find_one({"_id": ObjectId(assignment.id)})
+    existing_assignment = await collection.find_one({"_id": ObjectId(assignment.id)})
     if not existing_assignment:
         raise HTTPException(status_code=404, detail="Asignación no encontrada")
     
@@ -124,14 +236,16 @@ def update_assignment(assignment: UpdateAssignment):
     if 'account_id' in update_data:
         if not ObjectId.is_valid(update_data['account_id']):
             raise HTTPException(status_code=400, detail="account_id inválido")
-        account = accounts_collection.find_one({"_id": ObjectId(update_data['account_id'])})
+        update_data['account_id'] = ObjectId(update_data['account_id'])
+        account = await get_account_doc(update_data['account_id'])
         if not account:
             raise HTTPException(status_code=404, detail="Usuario no encontrado")
     
     if 'resource_id' in update_data:
         if not ObjectId.is_valid(update_data['resource_id']):
             raise HTTPException(status_code=400, detail="resource_id inválido")
-        resource = resources_collection.find_one({"_id": ObjectId(update_data['resource_id'])})
+        update_data['resource_id'] = ObjectId(update_data['resource_id'])
+        resource = await get_resource_doc(update_data['resource_id'])
         if not resource:
             raise HTTPException(status_code=404, detail="Recurso no encontrado")
     
@@ -140,28 +254,43 @@ def update_assignment(assignment: UpdateAssignment):
     new_start_time = update_data.get('start_time', existing_assignment['start_time'])
     new_end_time = update_data.get('end_time', existing_assignment['end_time'])
     
-    if is_overlapping(new_resource_id, new_start_time, new_end_time, exclude_id=assignment_id):
-        raise HTTPException(status_code=400, detail="La reserva se solapa con una existente para este recurso")
-    
     if not update_data:
         raise HTTPException(status_code=400, detail="No hay datos para actualizar")
     
-    result = collection.update_one({"_id": ObjectId(assignment_id)}, {"$set": update_data})
-    
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Asignación no encontrada")
-    
-    updated_assignment = collection.find_one({"_id": ObjectId(assignment_id)})
+    try:
+        async with resource_lock(new_resource_id) as lock:
+            if await is_overlapping(new_resource_id, new_start_time, new_end_time, exclude_id=assignment_id):
+                raise HTTPException(status_code=400, detail="La reserva se solapa con una existente para este recurso")
+            
+            await record_durations({ObjectId(new_resource_id): to_naive_utc(new_end_time) - to_naive_utc(new_start_time)})
+            # Si el cerrojo se perdió durante la escritura se restauran los valores anteriores
+            previous_values = {field: existing_assignment.get(field) for field in update_data}
+            result = await lock.write(
+                lambda: collection.update_one({"_id": ObjectId(assignment_id)}, bump_version({"$set": update_data})),
+                lambda result: collection.update_one({"_id": ObjectId(assignment_id)}, bump_version({"$set": previous_values}))
+            )
+            
+            if result.matched_count == 0:
+                raise HTTPException(status_code=404, detail="Asignación no encontrada")
+            
+            updated_assignment = await collection.find_one({"_id": ObjectId(assignment_id)})
+            if availability_engine:
+                availability_engine.remove(existing_assignment)
+                availability_engine.add(updated_assignment)
+    except ResourceLockError:
+        raise HTTPException(status_code=409, detail=RESOURCE_BUSY_DETAIL)
     return serialize_doc(updated_assignment)
 
 @router.delete("/{assignment_id}", response_model=dict)
-def delete_assignment(assignment_id: str):
+async def delete_assignment(assignment_id: str):
     if not ObjectId.is_valid(assignment_id):
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    result = collection.delete_one({"_id": ObjectId(assignment_id)})
+    deleted_assignment = await collection.find_one_and_delete({"_id": ObjectId(assignment_id)}, {"_id": 1, "resource_id": 1})
     
-    if result.deleted_count == 1:
+    if deleted_assignment:
+        if availability_engine:
+            availability_engine.remove(deleted_assignment)
         return {"detail": "Asignación eliminada exitosamente"}
     else:
         raise HTTPException(status_code=404, detail="Asignación no encontrada")
@@ -177,8 +306,8 @@ async def check_availability(
     Check if a time slot is available for booking
     """
     try:
-        start = datetime.strptime(start_time, "%Y-%m-%dT%H:%M:%S.%fZ")
-        end = datetime.strptime(end_time, "%Y-%m-%dT%H:%M:%S.%fZ")
+        start = datetime.strptime(start_time, DATE_FORMAT)
+        end = datetime.strptime(end_time, DATE_FORMAT)
     except ValueError as ve:
         
             raise HTTPException(status_code=400, detail=f"Invalid date format: {ve}")
@@ -187,10 +316,71 @@ async def check_availability(
         raise HTTPException(status_code=400, detail="Start time must be before end time")
 
     # Check for overlapping bookings
-    overlapping = collection.find_one({
+    if availability_engine:
+        return not await availability_engine.is_overlapping(resource_id, start, end, statuses=ACTIVE_STATUSES)
+
+    overlapping = await collection.find_one({
         "resource_id": ObjectId(resource_id),
-        "status": {"$in": ["pending", "active"]},
-        "$or": get_overlapping_query(start, end)
-    })
+        "status": {"$in": ACTIVE_STATUSES},
+        **get_overlapping_query(start, end, await get_max_duration(resource_id))
+    }, {"_id": 1})
 
     return overlapping is None
+
+
+@router.get("/availability-matrix/", response_model=Dict[str, bool])
+async def check_availability_matrix(
+    start_time: str,
+    end_time: str,
+    resource_ids: Optional[List[str]] = Query(None, example=["60d5ec49f8d4b45f8c1e4e7b"]),
+    account_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7a")
+):
+    """
+    Check a time slot for many resources at once. Resources are given as a list of
+    resource_ids or expanded from the resources of an account_id; either way the
+    answer comes from a single aggregation.
+    """
+    try:
+        start = datetime.strptime(start_time, DATE_FORMAT)
+        end = datetime.strptime(end_time, DATE_FORMAT)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=f"Invalid date format: {ve}")
+
+    if start >= end:
+        raise HTTPException(status_code=400, detail="Start time must be before end time")
+    if not resource_ids and not account_id:
+        raise HTTPException(status_code=400, detail="Se requiere resource_ids o account_id")
+    if resource_ids and not all(ObjectId.is_valid(resource_id) for resource_id in resource_ids):
+        raise HTTPException(status_code=400, detail="resource_id inválido")
+    if account_id and not ObjectId.is_valid(account_id):
+        raise HTTPException(status_code=400, detail="account_id inválido")
+
+    busy_filter = {"status": {"$in": ACTIVE_STATUSES}, **get_overlapping_query(start, end)}
+
+    if not account_id:
+        # Una agregación sobre assignments agrupada por recurso: solo aparecen los ocupados
+        object_ids = [ObjectId(resource_id) for resource_id in resource_ids]
+        busy = await collection.aggregate([
+            {"$match": {"resource_id": {"$in": object_ids}, **busy_filter}},
+            {"$group": {"_id": "$resource_id"}}
+        ])
+        busy_ids = {str(doc["_id"]) async for doc in busy}
+        return {str(resource_id): str(resource_id) not in busy_ids for resource_id in object_ids}
+
+    # Los recursos de la cuenta se expanden en la misma agregación con $lookup
+    resource_match = {"account_id": ObjectId(account_id)}
+    if resource_ids:
+        resource_match["_id"] = {"$in": [ObjectId(resource_id) for resource_id in resource_ids]}
+    matrix = await resources_collection.aggregate([
+        {"$match": resource_match},
+        {"$project": {"_id": 1}},
+        {"$lookup": {
+            "from": collection.name,
+            "localField": "_id",
+            "foreignField": "resource_id",
+            "pipeline": [{"$match": busy_filter}, {"$limit": 1}, {"$project": {"_id": 1}}],
+            "as": "busy"
+        }},
+        {"$project": {"available": {"$eq": [{"$size": "$busy"}, 0]}}}
+    ])
+    return {str(doc["_id"]): doc["available"] async for doc in matrix}
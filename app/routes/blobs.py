@@ -0,0 +1,26 @@
+import asyncio
+import stat as stat_module
+from fastapi import APIRouter, HTTPException, Request
+from app.file_response_utils import file_response
+from app.services.blob.blob_service import get_backend
+
+# Solo se incluye con BLOB_BACKEND=local; con Azure las imágenes se sirven desde el contenedor
+router = APIRouter(
+    prefix="/blobs",
+    tags=["Blobs"]
+)
+
+@router.api_route("/{blob_name:path}", methods=["GET", "HEAD"])
+async def get_blob(blob_name: str, request: Request):
+    backend = get_backend()
+    try:
+        path = backend.path(blob_name)
+        stat = await asyncio.to_thread(path.stat)
+    except (ValueError, OSError):
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    if path.name.startswith(".") or not stat_module.S_ISREG(stat.st_mode):
+        # Directorios y temporales de una subida en curso
+        raise HTTPException(status_code=404, detail="Imagen no encontrada")
+    media_type = await asyncio.to_thread(backend.media_type, path)
+    # El nombre del fichero es el hash de su contenido: sirve como ETag fuerte
+    return file_response(request, str(path), stat, media_type, f'"{path.name}"')
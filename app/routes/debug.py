@@ -0,0 +1,33 @@
+from fastapi import APIRouter, HTTPException
+from app.services.cache.cache_service import caches
+from app.services.jobs.jobs_service import get_job_stats
+from app.services.profiler.profiler_service import slow_query_profiler
+
+router = APIRouter(
+    prefix="/debug",
+    tags=["Debug"]
+)
+
+@router.get("/cache")
+async def get_cache_stats():
+    """
+    Hit, miss and eviction counters of the in-process caches
+    """
+    return {name: cache.stats() for name, cache in caches.items()}
+
+@router.get("/jobs")
+async def get_jobs_stats():
+    """
+    Number of background jobs in each status
+    """
+    return await get_job_stats()
+
+@router.get("/slow-queries")
+async def get_slow_queries():
+    """
+    Queries slower than SLOW_QUERY_THRESHOLD_MS grouped by filter shape, with a summary of
+    their explain plan, plus the most recent slow executions
+    """
+    if slow_query_profiler is None:
+        raise HTTPException(status_code=404, detail="Perfilador desactivado: defina SLOW_QUERY_PROFILER_ENABLED=true")
+    return slow_query_profiler.report()
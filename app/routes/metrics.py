@@ -0,0 +1,28 @@
+from typing import List
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.services.cache.cache_service import caches
+from app.services.metrics.metrics_service import format_family, render_metrics
+
+router = APIRouter(
+    tags=["Metrics"]
+)
+
+CACHE_COUNTERS = ("hits", "misses", "evictions", "expirations")
+
+def _cache_metrics() -> List[str]:
+    stats = {name: cache.stats() for name, cache in caches.items()}
+    lines = []
+    for counter in CACHE_COUNTERS:
+        lines.extend(format_family(f"cache_{counter}_total", "counter", f"Contador {counter} de la caché",
+                                   (("", ("cache",), (name,), values[counter]) for name, values in stats.items())))
+    lines.extend(format_family("cache_size", "gauge", "Entradas en la caché",
+                               (("", ("cache",), (name,), values["size"]) for name, values in stats.items())))
+    return lines
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Request latency, MongoDB command and cache metrics in Prometheus text format
+    """
+    return PlainTextResponse(render_metrics(_cache_metrics()), media_type="text/plain; version=0.0.4")
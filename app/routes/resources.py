@@ -1,10 +1,16 @@
 import json
-from fastapi import APIRouter, File, Form, HTTPException, Query, UploadFile
-from app.image_utils import create_thumbnail_from_upload
-from app.services.blob.blob_service import delete_blob_from_url, upload_image
+from fastapi import APIRouter, File, Form, HTTPException, Query, Request, Response, UploadFile
+from app.image_utils import is_image
+from app.services.blob.blob_service import release_image, release_resource_images, upload_images
 from app.models.resource import Resource, ResourceResponse, UpdateResource
 from app.database import db, serialize_doc
+from app.json_utils import ResponseShape, bson_json_response
+from app.etag_utils import bump_version, bump_version_stage, conditional_response, document_etag, initial_version, list_etag, strip_version_fields
+from app.services.cache.cache_service import get_resource_doc, resources_cache
+from app.services.image_processing.image_processing_service import enqueue_renditions
+from app.pagination_utils import ID_SORT, paginate, set_next_cursor
 from bson.objectid import ObjectId
+from pymongo import ReturnDocument
 from typing import Any, List, Optional
 
 router = APIRouter(
@@ -14,32 +20,43 @@ router = APIRouter(
 
 collection = db["resources"]
 
+# La versión solo se lee para el ETag; no forma parte de la respuesta
+RESOURCE_SHAPE = ResponseShape(ResourceResponse, "version")
+
 @router.post("/", response_model= ResourceResponse)
 async def create_resource(
     resource_data: str = Form(...),
     images: List[UploadFile] = File(...)
 ):
-    resource = json.loads(resource_data)
-    result = collection.insert_one(resource)
+    resource = strip_version_fields(json.loads(resource_data))
+    # Validaciones antes de insertar: una petición rechazada no deja un recurso a medias
+    if images and not is_image(images[0]):
+        raise HTTPException(status_code=400, detail="La primera imagen no es válida")
+    resource['account_id'] = ObjectId(resource['account_id'])
+    if not await collection.find_one({ "account_id": resource['account_id']}, {"_id": 1}):
+        raise HTTPException(status_code=400, detail="account_id inválido")
+
+    resource.update(initial_version())
+    result = await collection.insert_one(resource)
     resource_id = str(result.inserted_id)
     
-    # Upload thumbnail (first image)
+    # Upload raw images; the thumbnail renditions of the first one are generated by a
+    # background job and the original is used as thumbnail until they are ready
     if images:
-        thumbnail_url = await upload_image(create_thumbnail_from_upload(images[0]), resource_id, is_thumbnail=True)
-        resource["thumbnailUrl"] = thumbnail_url
-        
-        # Upload raw images
-        raw_urls = []
-        for image in images:
-            url = await upload_image(image, resource_id)
-            raw_urls.append(url)
-        resource["rawImagesUrls"] = raw_urls
-    
-    resource['account_id'] = ObjectId(resource['account_id'])
-    if not collection.find_one({ "account_id": resource['account_id']}):
-        raise HTTPException(status_code=400, detail="account_id inválido")
+        try:
+            resource["rawImagesUrls"] = await upload_images(images, resource_id)
+        except Exception:
+            # Sin sus imágenes el recurso no se crea: se borra con las que sí se subieron
+            await collection.delete_one({"_id": result.inserted_id})
+            await release_resource_images(resource_id)
+            raise
+        resource["thumbnailUrl"] = resource["rawImagesUrls"][0]
+        resource["processing_status"] = "processing"
     
-    collection.update_one({"_id": ObjectId(resource_id)}, {"$set": resource})
+    await collection.update_one({"_id": ObjectId(resource_id)}, bump_version({"$set": strip_version_fields(resource)}))
+    resources_cache.invalidate(resource_id)
+    if images:
+        await enqueue_renditions(resource_id, resource["rawImagesUrls"][0])
     
     resource["id"] = resource_id
     
@@ -51,48 +68,56 @@ async def update_resource(
     resource_data: str = Form(...),
     images: List[UploadFile] = File(None)
 ):
-    resource: Resource = json.loads(resource_data)
+    resource: Resource = strip_version_fields(json.loads(resource_data))
     
     # Handle new images if provided
     if images:
-        new_raw_urls = []
-        for image in images:
-            try:
-                url = await upload_image(image, resource_id)
-            except Exception:
-                raise HTTPException(status_code=400, detail="Error uploading image")
-            new_raw_urls.append(url)
+        try:
+            new_raw_urls = await upload_images(images, resource_id)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Error uploading image")
         resource["rawImagesUrls"].extend(new_raw_urls)
     
     resource["account_id"] = ObjectId(resource["account_id"])
-    collection.update_one(
+    await collection.update_one(
         {"_id": ObjectId(resource_id)},
-        {"$set": resource}
+        bump_version({"$set": resource})
     )
+    resources_cache.invalidate(resource_id)
     
     return serialize_doc(resource)
     
 @router.get("/", response_model=List[ResourceResponse])
-def get_resources(skip: int = 0, 
+async def get_resources(request: Request,
+                  response: Response,
+                  skip: int = 0, 
                   limit: int = 10, 
-                  account_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b")):
+                  account_id: Optional[str] = Query(None, example="60d5ec49f8d4b45f8c1e4e7b"),
+                  cursor: Optional[str] = Query(None, description="Cursor devuelto en la cabecera X-Next-Cursor de la página anterior")):
     query = {}
     if account_id:
         if not ObjectId.is_valid(account_id):
             raise HTTPException(status_code=400, detail="account_id inválido")
         query['account_id'] = ObjectId(account_id)
         
-    resources = collection.find(query).skip(skip).limit(limit)
-    resource_list = [serialize_doc(resource) for resource in resources]
-    return resource_list
+    resources, next_cursor = await paginate(collection, query, ID_SORT, skip, limit, cursor, RESOURCE_SHAPE.projection)
+    set_next_cursor(response, next_cursor)
+    not_modified = conditional_response(request, response, list_etag(resources))
+    if not_modified:
+        return not_modified
+    resource_list = [RESOURCE_SHAPE.to_json(resource) for resource in resources]
+    return bson_json_response(resource_list, response)
 
 @router.get("/{resource_id}", response_model=ResourceResponse)
-def get_resource(resource_id: str):
+async def get_resource(resource_id: str, request: Request, response: Response):
     if not ObjectId.is_valid(resource_id):
         raise HTTPException(status_code=400, detail="ID inválido")
-    resource = collection.find_one({"_id": ObjectId(resource_id)})
+    resource = await get_resource_doc(resource_id)
     if resource:
-        return serialize_doc(resource)
+        not_modified = conditional_response(request, response, document_etag(resource))
+        if not_modified:
+            return not_modified
+        return bson_json_response(RESOURCE_SHAPE.to_json(resource), response)
     else:
         raise HTTPException(status_code=404, detail="Recurso no encontrado")
     
@@ -100,27 +125,44 @@ def get_resource(resource_id: str):
 
 @router.delete("/{resource_id}/images")
 async def remove_image(resource_id: str, image_url: str):
-    # Remove image URL from resource
-    resource = await db.resources.find_one_and_update(
-        {"_id": resource_id},
-        {"$pull": {"rawImagesUrls": image_url}},
-        return_document=True
+    if not ObjectId.is_valid(resource_id):
+        raise HTTPException(status_code=400, detail="ID inválido")
+    # Remove image URL from resource. If it was still the thumbnail (its renditions failed
+    # or are not ready yet) the thumbnail moves to the next raw image in the same update,
+    # so it never points to a released blob
+    resource = await collection.find_one_and_update(
+        {"_id": ObjectId(resource_id)},
+        [
+            {"$set": {"rawImagesUrls": {"$filter": {"input": {"$ifNull": ["$rawImagesUrls", []]}, "cond": {"$ne": ["$$this", image_url]}}}}},
+            {"$set": {"thumbnailUrl": {"$cond": [
+                {"$eq": ["$thumbnailUrl", image_url]},
+                {"$ifNull": [{"$first": "$rawImagesUrls"}, ""]},
+                "$thumbnailUrl"
+            ]}}},
+            bump_version_stage()
+        ],
+        return_document=ReturnDocument.AFTER
     )
+    resources_cache.invalidate(resource_id)
+    if not resource:
+        raise HTTPException(status_code=404, detail="Recurso no encontrado")
     
-    # Delete the image from Azure Blob Storage
-    await delete_blob_from_url(image_url)
+    # Release the image; the blob is deleted once no resource references it
+    await release_image(image_url, resource_id)
     
-    return resource
+    return serialize_doc(resource)
 
 
 @router.delete("/{resource_id}", response_model=dict)
-def delete_resource(resource_id: str):
+async def delete_resource(resource_id: str):
     if not ObjectId.is_valid(resource_id):
         raise HTTPException(status_code=400, detail="ID inválido")
     
-    result = collection.delete_one({"_id": ObjectId(resource_id)})
+    result = await collection.delete_one({"_id": ObjectId(resource_id)})
+    resources_cache.invalidate(resource_id)
     
     if result.deleted_count == 1:
+        await release_resource_images(resource_id)
         return {"detail": "Recurso eliminado exitosamente"}
     else:
         raise HTTPException(status_code=404, detail="Recurso no encontrado")
@@ -0,0 +1,206 @@
+import bisect
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import UpdateOne
+from app.database import db
+from app.services.invalidation import invalidation_service
+from app.services.invalidation.invalidation_service import INVALIDATE_ALL, InvalidationEvent
+
+# Motor de disponibilidad en memoria; se activa con AVAILABILITY_ENGINE_ENABLED=true
+AVAILABILITY_ENGINE_ENABLED = os.getenv("AVAILABILITY_ENGINE_ENABLED", "false").lower() in ("1", "true", "yes")
+
+_PROJECTION = {"_id": 1, "resource_id": 1, "start_time": 1, "end_time": 1, "status": 1}
+
+def to_naive_utc(value: datetime) -> datetime:
+    # MongoDB devuelve fechas UTC sin zona horaria; las entradas con zona se normalizan igual
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class ResourceIntervals:
+    """
+    Reservas de un recurso ordenadas por start_time.
+
+    Solo las reservas que empiezan en (start - max_duration, end) pueden solaparse
+    con [start, end), así que la búsqueda es una bisección más el recorrido de los
+    candidatos de ese rango.
+    """
+
+    def __init__(self):
+        self._keys: List[Tuple[datetime, str]] = []
+        self._entries: List[Tuple[datetime, str, datetime, Optional[str]]] = []
+        self._starts: Dict[str, datetime] = {}
+        self._max_duration = timedelta(0)
+
+    def add(self, assignment_id: str, start: datetime, end: datetime, status: Optional[str]):
+        if assignment_id in self._starts:
+            self.remove(assignment_id)
+        key = (start, assignment_id)
+        index = bisect.bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        self._entries.insert(index, (start, assignment_id, end, status))
+        self._starts[assignment_id] = start
+        self._max_duration = max(self._max_duration, end - start)
+
+    def remove(self, assignment_id: str):
+        start = self._starts.pop(assignment_id, None)
+        if start is None:
+            return
+        index = bisect.bisect_left(self._keys, (start, assignment_id))
+        del self._keys[index]
+        del self._entries[index]
+
+    def __contains__(self, assignment_id: str) -> bool:
+        return assignment_id in self._starts
+
+    def overlaps(self, start: datetime, end: datetime, exclude_id: Optional[str] = None,
+                 statuses: Optional[Iterable[str]] = None) -> bool:
+        low = bisect.bisect_left(self._keys, (start - self._max_duration,))
+        high = bisect.bisect_left(self._keys, (end,))
+        for _, assignment_id, entry_end, status in self._entries[low:high]:
+            if entry_end <= start or assignment_id == exclude_id:
+                continue
+            if statuses is not None and status not in statuses:
+                continue
+            return True
+        return False
+
+class AvailabilityEngine:
+    """
+    Índice en memoria de las reservas por resource_id.
+
+    Cada recurso se carga desde MongoDB la primera vez que se consulta. Las rutas de
+    escritura notifican las altas, cambios y bajas para mantenerlo coherente; un
+    contador de generación evita que una carga en curso pise una escritura simultánea.
+    Todo se ejecuta en el bucle de eventos, así que solo las cargas ceden el control.
+    """
+
+    def __init__(self, collection):
+        self._collection = collection
+        self._resources: Dict[str, ResourceIntervals] = {}
+        self._generations: Dict[str, int] = {}
+        # Cambia con las bajas de las que no se conoce el recurso (ver remove_by_id)
+        self._epoch = 0
+
+    async def _load(self, resource_id: str) -> ResourceIntervals:
+        while True:
+            intervals = self._resources.get(resource_id)
+            if intervals is not None:
+                return intervals
+            generation = (self._generations.get(resource_id, 0), self._epoch)
+
+            intervals = ResourceIntervals()
+            async for doc in self._collection.find({"resource_id": ObjectId(resource_id)}, _PROJECTION):
+                intervals.add(str(doc["_id"]), doc["start_time"], doc["end_time"], doc.get("status"))
+
+            # Si hubo escrituras durante la carga se descarta y se vuelve a leer
+            if (self._generations.get(resource_id, 0), self._epoch) == generation:
+                self._resources.setdefault(resource_id, intervals)
+                return self._resources[resource_id]
+
+    async def is_overlapping(self, resource_id, start: datetime, end: datetime, exclude_id: Optional[str] = None,
+                             statuses: Optional[Iterable[str]] = None) -> bool:
+        intervals = await self._load(str(resource_id))
+        return intervals.overlaps(to_naive_utc(start), to_naive_utc(end),
+                                  str(exclude_id) if exclude_id else None, statuses)
+
+    def _touch(self, resource_id: str):
+        self._generations[resource_id] = self._generations.get(resource_id, 0) + 1
+
+    def add(self, assignment: dict):
+        resource_id = str(assignment["resource_id"])
+        self._touch(resource_id)
+        intervals = self._resources.get(resource_id)
+        if intervals is not None:
+            intervals.add(str(assignment["_id"]), to_naive_utc(assignment["start_time"]),
+                          to_naive_utc(assignment["end_time"]), assignment.get("status"))
+
+    def remove(self, assignment: dict):
+        resource_id = str(assignment["resource_id"])
+        self._touch(resource_id)
+        intervals = self._resources.get(resource_id)
+        if intervals is not None:
+            intervals.remove(str(assignment["_id"]))
+
+    def remove_by_id(self, assignment_id):
+        # Las bajas notificadas por otros workers solo traen el _id de la reserva
+        assignment_id = str(assignment_id)
+        for resource_id, intervals in self._resources.items():
+            if assignment_id in intervals:
+                self._touch(resource_id)
+                intervals.remove(assignment_id)
+                return
+        # Puede pertenecer a un recurso que se está cargando: esa carga se repite
+        self._epoch += 1
+
+    def invalidate(self, resource_id=None):
+        if resource_id is None:
+            # Las cargas en curso también se descartan
+            self._epoch += 1
+            self._resources.clear()
+            return
+        resource_id = str(resource_id)
+        self._touch(resource_id)
+        self._resources.pop(resource_id, None)
+
+availability_engine = AvailabilityEngine(db["assignments"]) if AVAILABILITY_ENGINE_ENABLED else None
+
+# Duración máxima de las reservas de cada recurso, en milisegundos, guardada en el recurso.
+# Como en ResourceIntervals, acota por abajo start_time en las consultas de solapamiento.
+# Solo crece: acortar o borrar una reserva la deja como cota superior, que sigue siendo válida.
+MAX_DURATION_FIELD = "max_booking_ms"
+
+async def get_max_duration(resource_id) -> Optional[timedelta]:
+    """
+    Duración máxima de las reservas del recurso, o None si todavía no se conoce (recursos
+    con reservas anteriores al campo, hasta su próxima escritura): la consulta no se acota.
+    """
+    doc = await db["resources"].find_one({"_id": ObjectId(resource_id)}, {MAX_DURATION_FIELD: 1})
+    if not doc or MAX_DURATION_FIELD not in doc:
+        return None
+    return timedelta(milliseconds=doc[MAX_DURATION_FIELD])
+
+async def record_durations(durations: Dict[ObjectId, timedelta]):
+    """
+    Amplía la duración máxima de cada recurso con la de la reserva que se va a guardar.
+    Se llama con el cerrojo de los recursos y antes de escribir, así que una consulta
+    posterior nunca ve una reserva más larga que la cota.
+
+    Los recursos sin el campo lo calculan primero a partir de sus reservas guardadas; bajo
+    el cerrojo ninguna otra escritura puede colarse entre el cálculo y la actualización.
+    """
+    resources = db["resources"]
+    updates = [UpdateOne({"_id": resource_id, MAX_DURATION_FIELD: {"$exists": True}},
+                         {"$max": {MAX_DURATION_FIELD: duration // timedelta(milliseconds=1)}})
+               for resource_id, duration in durations.items()]
+    result = await resources.bulk_write(updates, ordered=False)
+    if result.matched_count == len(updates):
+        return
+    missing = [doc["_id"] async for doc in resources.find(
+        {"_id": {"$in": list(durations)}, MAX_DURATION_FIELD: {"$exists": False}}, {"_id": 1})]
+    if not missing:
+        return
+    stored = await db["assignments"].aggregate([
+        {"$match": {"resource_id": {"$in": missing}}},
+        {"$group": {"_id": "$resource_id", "max": {"$max": {"$subtract": ["$end_time", "$start_time"]}}}}
+    ])
+    historical = {doc["_id"]: doc["max"] async for doc in stored}
+    await resources.bulk_write([
+        UpdateOne({"_id": resource_id}, {"$max": {MAX_DURATION_FIELD: max(
+            historical.get(resource_id) or 0, durations[resource_id] // timedelta(milliseconds=1))}})
+        for resource_id in missing
+    ], ordered=False)
+
+def _on_assignment_change(event: InvalidationEvent):
+    # Cambios hechos por cualquier worker; los propios llegan también y se aplican de nuevo sin efecto
+    if event.operation == INVALIDATE_ALL:
+        availability_engine.invalidate()
+        return
+    availability_engine.remove_by_id(event.document_id)
+    if event.document is not None:
+        availability_engine.add(event.document)
+
+if availability_engine:
+    invalidation_service.subscribe("assignments", _on_assignment_change)
@@ -0,0 +1,83 @@
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional, Tuple
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobBlock, BlobSasPermissions, ContentSettings, generate_blob_sas
+from azure.storage.blob.aio import BlobServiceClient
+from app.services.blob.blob_backend import BlobBackend
+
+
+class AzureBlobBackend(BlobBackend):
+    def __init__(self, connection_string: str, container_name: str):
+        self.service_client = BlobServiceClient.from_connection_string(connection_string)
+        self.container_client = self.service_client.get_container_client(container_name)
+        self.base_url = self.container_client.url
+
+    async def upload(self, blob_name: str, chunks: AsyncIterator[bytes], content_type: Optional[str]):
+        blob_client = self.container_client.get_blob_client(blob_name)
+        content_settings = ContentSettings(content_type=content_type)
+        first_chunk = await anext(chunks, b"")
+        second_chunk = await anext(chunks, None)
+
+        if second_chunk is None:
+            # Cabe en un solo bloque: una única petición
+            try:
+                await blob_client.upload_blob(first_chunk, content_settings=content_settings)
+            except ResourceExistsError:
+                pass
+            return
+
+        # Fichero grande: se envía bloque a bloque y se confirma la lista al final
+        block_ids: List[BlobBlock] = []
+
+        async def stage(chunk: bytes):
+            block_id = base64.b64encode(f"{len(block_ids):08d}".encode()).decode()
+            await blob_client.stage_block(block_id, chunk, length=len(chunk))
+            block_ids.append(BlobBlock(block_id=block_id))
+
+        await stage(first_chunk)
+        await stage(second_chunk)
+        async for chunk in chunks:
+            await stage(chunk)
+        await blob_client.commit_block_list(block_ids, content_settings=content_settings)
+
+    async def commit(self, temporary_name: str, blob_name: str):
+        # Copia en el servidor, sin volver a enviar el contenido; el origen se lee con un SAS
+        # de solo lectura y corta duración
+        source = self.container_client.get_blob_client(temporary_name)
+        sas = generate_blob_sas(
+            account_name=self.service_client.account_name,
+            container_name=self.container_client.container_name,
+            blob_name=temporary_name,
+            account_key=self.service_client.credential.account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.now(timezone.utc) + timedelta(minutes=15),
+        )
+        try:
+            await self.container_client.get_blob_client(blob_name).upload_blob_from_url(f"{source.url}?{sas}")
+        except ResourceExistsError:
+            pass
+        await self.delete(temporary_name)
+
+    async def download(self, blob_name: str) -> bytes:
+        stream = await self.container_client.get_blob_client(blob_name).download_blob()
+        return await stream.readall()
+
+    async def delete(self, blob_name: str):
+        try:
+            await self.container_client.get_blob_client(blob_name).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    async def delete_many(self, blob_names: List[str]):
+        # Una petición batch por cada 256 blobs, el máximo que admite Azure
+        for start in range(0, len(blob_names), 256):
+            await self.container_client.delete_blobs(*blob_names[start:start + 256], raise_on_any_failure=False)
+
+    async def list_blobs(self, prefix: str = "") -> AsyncIterator[Tuple[str, datetime]]:
+        # Azure pagina el listado en orden lexicográfico
+        async for blob in self.container_client.list_blobs(name_starts_with=prefix or None):
+            yield blob.name, blob.last_modified
+
+    async def close(self):
+        await self.service_client.close()
@@ -0,0 +1,50 @@
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+
+class BlobBackend(ABC):
+    """
+    Almacén en el que blob_service guarda las imágenes. Los blobs se identifican por su
+    nombre (objects/<sha256[:2]>/<sha256>) y se publican bajo base_url.
+    """
+    base_url: str
+
+    def url(self, blob_name: str) -> str:
+        return f"{self.base_url}/{blob_name}"
+
+    def blob_name(self, url: str) -> str:
+        prefix = f"{self.base_url}/"
+        if not url.startswith(prefix):
+            raise ValueError(f"URL fuera del almacén: {url}")
+        return url[len(prefix):]
+
+    @abstractmethod
+    async def upload(self, blob_name: str, chunks: AsyncIterator[bytes], content_type: Optional[str]):
+        """Guarda el contenido leído de chunks; si el blob ya existe no es un error."""
+
+    @abstractmethod
+    async def commit(self, temporary_name: str, blob_name: str):
+        """
+        Publica con el nombre blob_name el contenido subido como temporary_name y borra el
+        temporal. Si blob_name ya existe no es un error.
+        """
+
+    @abstractmethod
+    async def download(self, blob_name: str) -> bytes:
+        """Contenido completo del blob."""
+
+    @abstractmethod
+    async def delete(self, blob_name: str):
+        """Borra el blob; si no existe no es un error."""
+
+    @abstractmethod
+    async def delete_many(self, blob_names: List[str]):
+        """Borra varios blobs con el menor número de llamadas posible."""
+
+    @abstractmethod
+    def list_blobs(self, prefix: str = "") -> AsyncIterator[Tuple[str, datetime]]:
+        """(nombre, última modificación) de los blobs bajo prefix, en orden lexicográfico."""
+
+    async def close(self):
+        pass
@@ -1,41 +1,240 @@
-# Azure Blob Storage connection
+# Almacenamiento de imágenes: Azure Blob Storage o ficheros locales según BLOB_BACKEND
+import asyncio
 import hashlib
+import logging
 import os
-from azure.core.exceptions import ResourceExistsError
-from azure.storage.blob import BlobServiceClient
-from azure.storage.blob import ContentSettings
+import uuid
+from typing import AsyncIterator, List, Optional, Tuple
+from bson import ObjectId
 from fastapi import UploadFile
+from pymongo import ReturnDocument
+from app import registry
+from app.database import db
+from app.services.blob.blob_backend import BlobBackend
 
+logger = logging.getLogger(__name__)
 
-AZURE_CONNECTION_STRING = "DefaultEndpointsProtocol=https;AccountName=reservify;AccountKey=Qt7CYNn0JtC7GFH+aOvXD+yv3sjCMVLLw6rmak0Ir7nBFARP59SI5+clILSkrAtfvoerLZ1vUWLv+ASto2KxDA==;EndpointSuffix=core.windows.net;"
-CONTAINER_NAME = "images"
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
-container_client = blob_service_client.get_container_client(CONTAINER_NAME)
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "azure").lower()
 
-async def get_image_hash(file_contents: bytes) -> str:
-    return hashlib.md5(file_contents).hexdigest()
+AZURE_CONNECTION_STRING = os.getenv("AZURE_CONNECTION_STRING")
+CONTAINER_NAME = os.getenv("AZURE_CONTAINER_NAME", "images")
 
-async def upload_image(file: UploadFile, resource_id: str, is_thumbnail: bool = False) -> str:
-    contents = await file.read()
-    file_hash = await get_image_hash(contents)
-    
-    # Include resource_id in blob name to ensure uniqueness per resource
-    blob_name = f"{resource_id}/{'thumbnails' if is_thumbnail else 'raw'}/{file_hash}{os.path.splitext(file.filename)[1]}"
-    
-    try:
-        blob_client = container_client.get_blob_client(blob_name)
+# Directorio de los blobs y URL pública bajo la que se sirven con el backend local
+BLOB_LOCAL_ROOT = os.getenv("BLOB_LOCAL_ROOT", "blobs")
+BLOB_PUBLIC_URL = os.getenv("BLOB_PUBLIC_URL", "/blobs")
+
+# Prefijo de los blobs direccionados por contenido: objects/<sha256[:2]>/<sha256>
+OBJECTS_PREFIX = "objects"
+# Subidas en curso de ficheros de varios bloques, antes de conocer su hash. Las que deja un
+# proceso que muere no las referencia ningún recurso y las borra el recolector (blob_gc)
+UPLOADS_PREFIX = "uploads"
+
+# Subidas simultáneas de una misma petición, tope de subidas simultáneas de todo el proceso
+# (todas las peticiones juntas) y tamaño de cada bloque enviado
+BLOB_UPLOAD_CONCURRENCY = int(os.getenv("BLOB_UPLOAD_CONCURRENCY", "10"))
+BLOB_UPLOAD_MAX_CONCURRENCY = int(os.getenv("BLOB_UPLOAD_MAX_CONCURRENCY", "64"))
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", str(4 * 1024 * 1024)))
+
+def _create_backend() -> BlobBackend:
+    # Cada driver importa su SDK solo si se usa
+    if BLOB_BACKEND == "azure":
+        if not AZURE_CONNECTION_STRING:
+            raise ValueError("La variable de entorno AZURE_CONNECTION_STRING debe estar definida en el archivo .env cuando BLOB_BACKEND=azure")
+        from app.services.blob.azure_backend import AzureBlobBackend
+        return AzureBlobBackend(AZURE_CONNECTION_STRING, CONTAINER_NAME)
+    if BLOB_BACKEND == "local":
+        from app.services.blob.local_backend import LocalBlobBackend
+        return LocalBlobBackend(BLOB_LOCAL_ROOT, BLOB_PUBLIC_URL)
+    raise ValueError(f"BLOB_BACKEND desconocido: {BLOB_BACKEND}")
+
+registry.register("blob_backend", _create_backend, lambda backend: backend.close())
+
+def get_backend() -> BlobBackend:
+    return registry.get("blob_backend")
+
+_upload_semaphore = asyncio.Semaphore(BLOB_UPLOAD_MAX_CONCURRENCY)
+
+# Un documento por contenido: {_id: sha256, blob_name, owners: [resource_id, ...], stored, referenced_at}.
+# Mientras se borra su blob lleva además deleting: un ObjectId que identifica ese borrado
+refs_collection = db["blob_refs"]
+
+# Espera máxima de una subida a que termine el borrado del mismo contenido; pasado ese
+# tiempo se da por muerto el proceso que borraba y la subida sigue adelante
+BLOB_DELETE_WAIT_SECONDS = float(os.getenv("BLOB_DELETE_WAIT_SECONDS", "30"))
+
+async def _hashed_chunks(first_chunks: List[bytes], file: UploadFile, file_hash) -> AsyncIterator[bytes]:
+    # Los bloques ya leídos y después el resto del fichero, actualizando el hash al pasar
+    for chunk in first_chunks:
+        file_hash.update(chunk)
+        yield chunk
+    while True:
+        chunk = await file.read(BLOB_CHUNK_SIZE)
+        if not chunk:
+            return
+        file_hash.update(chunk)
+        yield chunk
+
+def _object_name(digest: str) -> str:
+    return f"{OBJECTS_PREFIX}/{digest[:2]}/{digest}"
+
+async def _wait_for_deletion(digest: str, deletion: ObjectId):
+    # Cuando el borrado termina la referencia queda con stored=False y se sube de nuevo
+    deadline = asyncio.get_running_loop().time() + BLOB_DELETE_WAIT_SECONDS
+    delay = 0.01
+    while await refs_collection.find_one({"_id": digest, "deleting": deletion}, {"_id": 1}):
+        if asyncio.get_running_loop().time() >= deadline:
+            await refs_collection.update_one({"_id": digest, "deleting": deletion},
+                                             {"$unset": {"deleting": ""}, "$set": {"stored": False}})
+            return
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+async def _add_owner(digest: str, resource_id: str) -> Tuple[Optional[dict], bool]:
+    """
+    Registra resource_id como propietario de la referencia de digest, creándola si no
+    existe. Devuelve la referencia anterior y si el propietario es nuevo.
+    """
+    added = None
+    while True:
+        ref = await refs_collection.find_one_and_update(
+            {"_id": digest},
+            {"$addToSet": {"owners": resource_id}, "$setOnInsert": {"blob_name": _object_name(digest), "stored": False},
+             "$currentDate": {"referenced_at": True}},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        if added is None:
+            added = not ref or resource_id not in ref.get("owners", [])
+        # Un blob que se está borrando no cuenta como almacenado: se espera a que el borrado
+        # termine y, con este propietario ya registrado, la referencia no se borra
+        if not (ref and ref.get("deleting")):
+            return ref, added
+        await _wait_for_deletion(digest, ref["deleting"])
+
+async def upload_image(file: UploadFile, resource_id: str) -> str:
+    """
+    Sube una imagen al almacenamiento direccionado por contenido y registra resource_id
+    como uno de sus propietarios. El nombre del blob es el SHA-256 del contenido, así que
+    la misma imagen subida para varios recursos se guarda una sola vez.
+
+    El fichero se lee una sola vez. Si cabe en un bloque de BLOB_CHUNK_SIZE, el hash se
+    calcula antes de subirlo y, si el contenido ya está almacenado, no se transfiere nada.
+    Si no, el hash se calcula mientras se sube a un nombre temporal bajo UPLOADS_PREFIX,
+    que después se publica con su nombre definitivo o se borra si ya existía.
+
+    Como mucho BLOB_UPLOAD_MAX_CONCURRENCY subidas avanzan a la vez en el proceso; el
+    resto espera turno.
+    """
+    backend = get_backend()
+    async with _upload_semaphore:
+        await file.seek(0)
+        first_chunks = [await file.read(BLOB_CHUNK_SIZE)]
+        second_chunk = await file.read(BLOB_CHUNK_SIZE)
+        file_hash = hashlib.sha256()
+        temporary_name = None
+        if second_chunk:
+            first_chunks.append(second_chunk)
+            temporary_name = f"{UPLOADS_PREFIX}/{uuid.uuid4().hex}"
+            await backend.upload(temporary_name, _hashed_chunks(first_chunks, file, file_hash), file.content_type)
+        else:
+            file_hash.update(first_chunks[0])
+        digest = file_hash.hexdigest()
+        blob_name = _object_name(digest)
+
+        try:
+            ref, added = await _add_owner(digest, resource_id)
+            if not (ref and ref.get("stored")):
+                try:
+                    if temporary_name:
+                        await backend.commit(temporary_name, blob_name)
+                        temporary_name = None
+                    else:
+                        await backend.upload(blob_name, _hashed_chunks(first_chunks, file, hashlib.sha256()), file.content_type)
+                except Exception:
+                    # La referencia recién añadida no debe mantener vivo un blob que no existe
+                    if added:
+                        await _release(digest, resource_id)
+                    raise
+                await refs_collection.update_one({"_id": digest}, {"$set": {"stored": True}})
+        finally:
+            if temporary_name:
+                await _delete_blob(temporary_name)
         await file.seek(0)
-        blob_client.upload_blob(contents, content_settings=ContentSettings(content_type=file.content_type))
-    except ResourceExistsError:
-        pass
-    
-    return f"{container_client.url}/{blob_name}"
-
-async def delete_blob_from_url(url: str):
-    # Extract blob name from URL
-    blob_name = url.split(f"{container_client.url}/")[1]
-    blob_client = container_client.get_blob_client(blob_name)
+
+    return backend.url(blob_name)
+
+async def upload_images(files: List[UploadFile], resource_id: str) -> List[str]:
+    # Hasta BLOB_UPLOAD_CONCURRENCY imágenes de la petición en paralelo (por defecto 10, una
+    # petición típica entera): una petición con muchas más no ocupa todo el tope del proceso.
+    # El orden de las URLs es el de files
+    request_semaphore = asyncio.Semaphore(BLOB_UPLOAD_CONCURRENCY)
+
+    async def upload(file: UploadFile) -> str:
+        async with request_semaphore:
+            return await upload_image(file, resource_id)
+
+    # Si una falla se espera a las demás antes de propagar el error: quien libere las
+    # referencias del recurso después no deja atrás ninguna subida a medias
+    results = await asyncio.gather(*(upload(file) for file in files), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+async def download_image(url: str) -> bytes:
+    backend = get_backend()
+    return await backend.download(backend.blob_name(url))
+
+async def _delete_blob(blob_name: str):
     try:
-        blob_client.delete_blob()
+        await get_backend().delete(blob_name)
     except Exception as e:
-        print(f"Error deleting blob: {e}")
\ No newline at end of file
+        logger.warning("Error deleting blob %s: %s", blob_name, e)
+
+async def drop_tombstones(deletion: ObjectId, deleted: bool = True):
+    """
+    Termina el borrado identificado por deletion, después de borrar los blobs. Las
+    referencias que siguen sin propietarios se borran; las que ganaron alguno mientras
+    tanto (subidas que esperaban) quedan con stored=False para que se suban de nuevo.
+    Si el borrado falló (deleted=False) solo se quita la marca.
+    """
+    if not deleted:
+        await refs_collection.update_many({"deleting": deletion}, {"$unset": {"deleting": ""}})
+        return
+    await refs_collection.delete_many({"deleting": deletion, "owners": {"$size": 0}})
+    await refs_collection.update_many({"deleting": deletion}, {"$unset": {"deleting": ""}, "$set": {"stored": False}})
+
+async def _release(digest: str, resource_id: str):
+    await refs_collection.update_one({"_id": digest}, {"$pull": {"owners": resource_id}})
+    # Solo quien marca la referencia sin propietarios borra el blob; la marca se quita
+    # después del borrado, así que una subida del mismo contenido no lo da por almacenado
+    deletion = ObjectId()
+    ref = await refs_collection.find_one_and_update(
+        {"_id": digest, "owners": {"$size": 0}, "deleting": {"$exists": False}},
+        {"$set": {"deleting": deletion}}
+    )
+    if ref:
+        try:
+            await get_backend().delete(ref["blob_name"])
+        except Exception as e:
+            logger.warning("Error deleting blob %s: %s", ref["blob_name"], e)
+            await drop_tombstones(deletion, deleted=False)
+            return
+        await drop_tombstones(deletion)
+
+async def release_image(url: str, resource_id: str):
+    """
+    Quita a resource_id de los propietarios de la imagen de url y borra el blob cuando
+    ya no queda ninguno.
+    """
+    blob_name = get_backend().blob_name(url)
+    if not blob_name.startswith(f"{OBJECTS_PREFIX}/"):
+        # Blobs anteriores al almacenamiento por contenido: pertenecen a un único recurso
+        await _delete_blob(blob_name)
+        return
+    await _release(blob_name.rsplit("/", 1)[1], resource_id)
+
+async def release_resource_images(resource_id: str):
+    # Todas las referencias de un recurso, por ejemplo al borrarlo
+    async for ref in refs_collection.find({"owners": resource_id}, {"_id": 1}):
+        await _release(ref["_id"], resource_id)
@@ -0,0 +1,106 @@
+import asyncio
+import mimetypes
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+from app.services.blob.blob_backend import BlobBackend
+
+# Firmas de los formatos de imagen que se sirven; los blobs no guardan su content-type
+SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+]
+
+
+class LocalBlobBackend(BlobBackend):
+    """
+    Guarda los blobs como ficheros bajo root, para desarrollo, despliegues sin Azure y
+    pruebas de carga sin red. Los sirve la ruta /blobs (app/routes/blobs.py).
+
+    latency (segundos por bloque subido) simula un almacén remoto en los benchmarks.
+    """
+
+    def __init__(self, root: str, base_url: str, latency: float = 0):
+        self.root = Path(root).resolve()
+        self.base_url = base_url.rstrip("/")
+        self.latency = latency
+
+    def path(self, blob_name: str) -> Path:
+        path = (self.root / blob_name).resolve()
+        if not path.is_relative_to(self.root) or path == self.root:
+            raise ValueError(f"Nombre de blob inválido: {blob_name}")
+        return path
+
+    async def upload(self, blob_name: str, chunks: AsyncIterator[bytes], content_type: Optional[str]):
+        path = self.path(blob_name)
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        # Se escribe en un temporal y se renombra: nunca se sirve un fichero a medias
+        temporary = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        file = await asyncio.to_thread(open, temporary, "wb")
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(file.write, chunk)
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+        except BaseException:
+            await asyncio.to_thread(file.close)
+            await asyncio.to_thread(temporary.unlink, missing_ok=True)
+            raise
+        await asyncio.to_thread(file.close)
+        await asyncio.to_thread(os.replace, temporary, path)
+
+    async def commit(self, temporary_name: str, blob_name: str):
+        path = self.path(blob_name)
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        await asyncio.to_thread(os.replace, self.path(temporary_name), path)
+
+    async def download(self, blob_name: str) -> bytes:
+        return await asyncio.to_thread(self.path(blob_name).read_bytes)
+
+    async def delete(self, blob_name: str):
+        await asyncio.to_thread(self.path(blob_name).unlink, missing_ok=True)
+
+    async def delete_many(self, blob_names: List[str]):
+        for blob_name in blob_names:
+            await self.delete(blob_name)
+
+    def _walk(self, directory: Path, relative: str, prefix: str) -> Iterator[Tuple[str, datetime]]:
+        # Se ordena cada directorio como si sus subdirectorios terminaran en "/", así el
+        # recorrido sale en el mismo orden que los nombres completos ("a.b" < "a/c")
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name + "/" if entry.is_dir() else entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            name = f"{relative}{entry.name}"
+            if entry.is_dir():
+                # Solo se baja a los directorios que pueden contener blobs bajo prefix
+                if f"{name}/".startswith(prefix) or prefix.startswith(f"{name}/"):
+                    yield from self._walk(Path(entry.path), f"{name}/", prefix)
+            elif name.startswith(prefix):
+                yield name, datetime.fromtimestamp(entry.stat().st_mtime, timezone.utc)
+
+    async def list_blobs(self, prefix: str = "") -> AsyncIterator[Tuple[str, datetime]]:
+        walk = self._walk(self.root, "", prefix)
+        while True:
+            # El recorrido avanza en un hilo por tandas para no bloquear el bucle de eventos
+            batch = await asyncio.to_thread(lambda: [item for _, item in zip(range(1000), walk)])
+            for name, last_modified in batch:
+                yield name, last_modified
+            if len(batch) < 1000:
+                return
+
+    def media_type(self, path: Path) -> str:
+        with open(path, "rb") as file:
+            head = file.read(12)
+        for signature, media_type in SIGNATURES:
+            if head.startswith(signature):
+                return media_type
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return "image/webp"
+        return mimetypes.guess_type(path.name)[0] or "application/octet-stream"
@@ -0,0 +1,179 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, List, Optional
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from app.database import db
+from app import registry
+from app.services.blob.blob_service import OBJECTS_PREFIX, drop_tombstones, get_backend, refs_collection
+
+logger = logging.getLogger(__name__)
+
+# Antigüedad mínima de un blob sin referencias para borrarlo: protege las subidas en curso,
+# cuyo recurso todavía no guarda la URL
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+BLOB_GC_BATCH_SIZE = int(os.getenv("BLOB_GC_BATCH_SIZE", "256"))
+# Cada cuánto se ejecuta dentro de la API (0 lo desactiva)
+BLOB_GC_INTERVAL_SECONDS = float(os.getenv("BLOB_GC_INTERVAL_SECONDS", "0"))
+
+resources_collection = db["resources"]
+
+_task: Optional[asyncio.Task] = None
+
+# Todas las URLs de imagen de cada recurso: thumbnailUrl, rawImagesUrls y las de renditions
+# ({"128": {"webp": url, ...}, ...}), sin repetir y ordenadas
+REFERENCED_URLS_PIPELINE = [
+    {"$project": {"urls": {"$concatArrays": [
+        [{"$ifNull": ["$thumbnailUrl", ""]}],
+        {"$ifNull": ["$rawImagesUrls", []]},
+        {"$reduce": {
+            "input": {"$objectToArray": {"$ifNull": ["$renditions", {}]}},
+            "initialValue": [],
+            "in": {"$concatArrays": ["$$value", {"$map": {
+                "input": {"$objectToArray": "$$this.v"}, "as": "rendition", "in": "$$rendition.v"
+            }}]}
+        }}
+    ]}}},
+    {"$unwind": "$urls"},
+    {"$group": {"_id": "$urls"}},
+    {"$sort": {"_id": 1}},
+]
+
+async def _referenced_blob_names(prefix: str) -> AsyncIterator[str]:
+    # Todas las URLs comparten base_url, así que ordenar por URL es ordenar por nombre de blob
+    urls = await resources_collection.aggregate(REFERENCED_URLS_PIPELINE, allowDiskUse=True)
+    async for doc in urls:
+        try:
+            blob_name = get_backend().blob_name(doc["_id"])
+        except ValueError:
+            # Vacías o de otro almacén
+            continue
+        if blob_name.startswith(prefix):
+            yield blob_name
+
+async def find_orphans(prefix: str = "", grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> AsyncIterator[str]:
+    """
+    Blobs bajo prefix que ningún recurso referencia y que son más antiguos que el periodo
+    de gracia.
+
+    El listado del almacén y las URLs referenciadas llegan ordenados y se recorren a la vez
+    como en un merge join: solo hay un elemento de cada lado en memoria, sea cual sea el
+    número de blobs.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    references = _referenced_blob_names(prefix)
+    reference = await anext(references, None)
+    async for blob_name, last_modified in get_backend().list_blobs(prefix):
+        while reference is not None and reference < blob_name:
+            reference = await anext(references, None)
+        if reference == blob_name or last_modified > cutoff:
+            continue
+        yield blob_name
+
+async def _delete_batch(blob_names: List[str], grace_seconds: float) -> int:
+    digests = {blob_name.rsplit("/", 1)[1]: blob_name for blob_name in blob_names if blob_name.startswith(f"{OBJECTS_PREFIX}/")}
+    to_delete = [blob_name for blob_name in blob_names if not blob_name.startswith(f"{OBJECTS_PREFIX}/")]
+    if digests:
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+        # Los blobs sin documento (por ejemplo, si el proceso murió entre borrar la referencia
+        # y el blob) reciben uno antiguo para pasar por la misma comprobación
+        try:
+            await refs_collection.insert_many(
+                [{"_id": digest, "blob_name": blob_name, "owners": [], "stored": False, "referenced_at": cutoff}
+                 for digest, blob_name in digests.items()],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        # Se marcan a la vez, como en _release, las referencias que siguen sin propietarios ni
+        # uso desde cutoff: una subida que reutiliza el contenido añade un propietario y renueva
+        # referenced_at, y esa referencia, con su blob, se conserva. Las subidas que llegan
+        # durante el borrado esperan a que se quite la marca y suben el contenido de nuevo.
+        deletion = ObjectId()
+        await refs_collection.update_many(
+            {"_id": {"$in": list(digests)}, "owners": {"$size": 0}, "referenced_at": {"$lte": cutoff},
+             "deleting": {"$exists": False}},
+            {"$set": {"deleting": deletion}}
+        )
+        claimed = [doc["_id"] async for doc in refs_collection.find({"deleting": deletion}, {"_id": 1})]
+        to_delete += [digests[digest] for digest in claimed]
+    # Los blobs anteriores al almacenamiento por contenido no tienen referencia que comprobar
+    if to_delete:
+        try:
+            await get_backend().delete_many(to_delete)
+        except Exception:
+            if digests:
+                await drop_tombstones(deletion, deleted=False)
+            raise
+    if digests:
+        await drop_tombstones(deletion)
+    return len(to_delete)
+
+async def collect_garbage(prefix: str = "", grace_seconds: float = BLOB_GC_GRACE_SECONDS,
+                          batch_size: int = BLOB_GC_BATCH_SIZE, dry_run: bool = False) -> dict:
+    """
+    Borra los blobs huérfanos bajo prefix en tandas de batch_size.
+
+    :return: Número de huérfanos encontrados y de blobs borrados.
+    """
+    orphans = 0
+    deleted = 0
+    batch: List[str] = []
+    async for blob_name in find_orphans(prefix, grace_seconds):
+        orphans += 1
+        if dry_run:
+            continue
+        batch.append(blob_name)
+        if len(batch) >= batch_size:
+            deleted += await _delete_batch(batch, grace_seconds)
+            batch = []
+    if batch:
+        deleted += await _delete_batch(batch, grace_seconds)
+    return {"orphans": orphans, "deleted": deleted}
+
+async def _run_periodically():
+    while True:
+        await asyncio.sleep(BLOB_GC_INTERVAL_SECONDS)
+        try:
+            logger.info("Blob GC: %s", await collect_garbage())
+        except Exception:
+            logger.exception("Blob GC failed")
+
+def start():
+    """
+    Lanza la recolección periódica si BLOB_GC_INTERVAL_SECONDS > 0. Con varios procesos
+    de la API basta con activarla en uno.
+    """
+    global _task
+    if BLOB_GC_INTERVAL_SECONDS > 0 and _task is None:
+        _task = asyncio.create_task(_run_periodically())
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Borra las imágenes del almacén que ningún recurso referencia")
+    parser.add_argument("--prefix", default="", help="Solo los blobs cuyo nombre empieza por este prefijo")
+    parser.add_argument("--grace-seconds", type=float, default=BLOB_GC_GRACE_SECONDS)
+    parser.add_argument("--batch-size", type=int, default=BLOB_GC_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Solo cuenta los huérfanos")
+    args = parser.parse_args()
+
+    try:
+        report = await collect_garbage(args.prefix, args.grace_seconds, args.batch_size, args.dry_run)
+    finally:
+        await registry.close_all()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+# Para ejecutar con `python -m app.services.blob_gc.blob_gc_service --dry-run`
+if __name__ == "__main__":
+    asyncio.run(_main())
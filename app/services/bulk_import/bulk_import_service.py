@@ -0,0 +1,237 @@
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+from bson import ObjectId
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+from app import registry
+from app.database import db
+from app.etag_utils import initial_version
+from app.indexes import ensure_indexes, verify_indexes
+from app.models.assignment import Assignment
+from app.services.availability.availability_service import ResourceIntervals, availability_engine, record_durations, to_naive_utc
+from app.services.reservation.reservation_service import ResourceLocks, resource_locks
+
+# Filas que se validan e insertan juntas; acota la memoria al importar ficheros grandes
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+
+# Error de las filas de un recurso cuyo cerrojo tiene otro proceso
+RESOURCE_BUSY_DETAIL = "El recurso tiene otra reserva en curso"
+
+collection = db["assignments"]
+accounts_collection = db["accounts"]
+resources_collection = db["resources"]
+
+def parse_rows(stream: io.TextIOBase, file_format: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Lee un fichero NDJSON o CSV y devuelve tuplas (número de fila, datos) sin cargarlo
+    entero en memoria. Las filas que no se pueden leer se devuelven con un error.
+    """
+    if file_format == "csv":
+        for row_number, row in enumerate(csv.DictReader(stream), start=1):
+            yield row_number, {key: value for key, value in row.items() if key and value != ""}
+        return
+    if file_format != "ndjson":
+        raise ValueError(f"Formato no soportado: {file_format}")
+    for row_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield row_number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield row_number, {"__error__": f"JSON inválido: {e.msg}"}
+
+def _batches(rows: Iterable[Tuple[int, dict]], size: int) -> Iterator[List[Tuple[int, dict]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+async def _import_batch(rows: List[Tuple[int, dict]], errors: List[dict]) -> int:
+    # 1. Validación de cada fila con el mismo modelo que usa POST /assignments/
+    candidates = []
+    for row_number, row in rows:
+        if "__error__" in row:
+            errors.append({"row": row_number, "detail": row["__error__"]})
+            continue
+        try:
+            assignment = Assignment(**row)
+        except ValidationError as e:
+            errors.append({"row": row_number, "detail": "; ".join(error["msg"] for error in e.errors())})
+            continue
+        if not ObjectId.is_valid(assignment.account_id):
+            errors.append({"row": row_number, "detail": "account_id inválido"})
+            continue
+        if not ObjectId.is_valid(assignment.resource_id):
+            errors.append({"row": row_number, "detail": "resource_id inválido"})
+            continue
+        assignment_dict = assignment.dict()
+        assignment_dict["status"] = row.get("status") or "pending"
+        assignment_dict["account_id"] = ObjectId(assignment.account_id)
+        assignment_dict["resource_id"] = ObjectId(assignment.resource_id)
+        assignment_dict["start_time"] = to_naive_utc(assignment.start_time)
+        assignment_dict["end_time"] = to_naive_utc(assignment.end_time)
+        assignment_dict.update(initial_version())
+        candidates.append((row_number, assignment_dict))
+    if not candidates:
+        return 0
+
+    # 2. Existencia de cuentas y recursos con una consulta $in por colección
+    account_ids = list({doc["account_id"] for _, doc in candidates})
+    resource_ids = list({doc["resource_id"] for _, doc in candidates})
+    known_accounts = {doc["_id"] async for doc in accounts_collection.find({"_id": {"$in": account_ids}}, {"_id": 1})}
+    known_resources = {doc["_id"] async for doc in resources_collection.find({"_id": {"$in": resource_ids}}, {"_id": 1})}
+
+    by_resource: Dict[ObjectId, List[Tuple[int, dict]]] = {}
+    for row_number, doc in candidates:
+        if doc["account_id"] not in known_accounts:
+            errors.append({"row": row_number, "detail": "Usuario no encontrado"})
+        elif doc["resource_id"] not in known_resources:
+            errors.append({"row": row_number, "detail": "Recurso no encontrado"})
+        else:
+            by_resource.setdefault(doc["resource_id"], []).append((row_number, doc))
+    if not by_resource:
+        return 0
+
+    # Los recursos del lote quedan bloqueados desde la lectura de lo guardado hasta la
+    # inserción, igual que en create_assignment. Un recurso ocupado solo descarta sus filas.
+    async with resource_locks(by_resource) as locks:
+        _discard_unlocked(by_resource, locks.held, errors)
+        if not by_resource:
+            return 0
+        return await _insert_without_conflicts(by_resource, locks, errors)
+
+def _discard_unlocked(groups: Dict[ObjectId, List[Tuple[int, dict]]], held: Set[str], errors: List[dict]):
+    for resource_id in [resource_id for resource_id in groups if str(resource_id) not in held]:
+        errors.extend({"row": row_number, "detail": RESOURCE_BUSY_DETAIL}
+                      for row_number, _ in groups.pop(resource_id))
+
+def _keep_locked(rows: List[Tuple[int, dict]], held: Set[str], errors: List[dict]) -> List[Tuple[int, dict]]:
+    kept = []
+    for row_number, doc in rows:
+        if str(doc["resource_id"]) in held:
+            kept.append((row_number, doc))
+        else:
+            errors.append({"row": row_number, "detail": RESOURCE_BUSY_DETAIL})
+    return kept
+
+async def _insert_without_conflicts(by_resource: Dict[ObjectId, List[Tuple[int, dict]]], locks: ResourceLocks,
+                                    errors: List[dict]) -> int:
+    # 3. Reservas guardadas que tocan el rango del lote de cada recurso, en una sola consulta
+    intervals = {resource_id: ResourceIntervals() for resource_id in by_resource}
+    stored = collection.find(
+        {"$or": [
+            {
+                "resource_id": resource_id,
+                "start_time": {"$lt": max(doc["end_time"] for _, doc in group)},
+                "end_time": {"$gt": min(doc["start_time"] for _, doc in group)}
+            }
+            for resource_id, group in by_resource.items()
+        ]},
+        {"_id": 1, "resource_id": 1, "start_time": 1, "end_time": 1, "status": 1}
+    )
+    async for doc in stored:
+        intervals[doc["resource_id"]].add(str(doc["_id"]), doc["start_time"], doc["end_time"], doc.get("status"))
+
+    # 4. Un solo recorrido por recurso: cada fila se compara con lo guardado y con las
+    #    filas del lote aceptadas antes que ella
+    to_insert = []
+    for resource_id, group in by_resource.items():
+        resource_intervals = intervals[resource_id]
+        group.sort(key=lambda item: (item[1]["start_time"], item[0]))
+        for row_number, doc in group:
+            if resource_intervals.overlaps(doc["start_time"], doc["end_time"]):
+                errors.append({"row": row_number, "detail": "La reserva se solapa con una existente para este recurso"})
+                continue
+            resource_intervals.add(f"row-{row_number}", doc["start_time"], doc["end_time"], doc["status"])
+            to_insert.append((row_number, doc))
+    if not to_insert:
+        return 0
+
+    # 5. El préstamo de los cerrojos se renueva justo antes de escribir; las filas de un
+    #    recurso cuyo cerrojo caducó y tomó otro proceso se descartan
+    to_insert = _keep_locked(to_insert, await locks.renew(), errors)
+    if not to_insert:
+        return 0
+
+    # 6. Duración máxima de cada recurso (acota las consultas de solapamiento) y escritura
+    #    desordenada: un fallo no detiene al resto de filas
+    durations: Dict[ObjectId, timedelta] = {}
+    for _, doc in to_insert:
+        durations[doc["resource_id"]] = max(durations.get(doc["resource_id"], timedelta(0)), doc["end_time"] - doc["start_time"])
+    await record_durations(durations)
+    docs = [doc for _, doc in to_insert]
+    try:
+        result = await collection.insert_many(docs, ordered=False)
+        inserted_ids = set(result.inserted_ids)
+    except BulkWriteError as e:
+        failed = {error["index"] for error in e.details["writeErrors"]}
+        for error in e.details["writeErrors"]:
+            errors.append({"row": to_insert[error["index"]][0], "detail": error["errmsg"]})
+        inserted_ids = {doc["_id"] for index, doc in enumerate(docs) if index not in failed}
+
+    # 7. Y se comprueba de nuevo después, como en ResourceLock.write: las filas de un cerrojo
+    #    perdido durante la escritura se borran
+    inserted = [(row_number, doc) for row_number, doc in to_insert if doc["_id"] in inserted_ids]
+    kept = _keep_locked(inserted, await locks.renew(), errors)
+    if len(kept) < len(inserted):
+        kept_ids = {doc["_id"] for _, doc in kept}
+        await collection.delete_many({"_id": {"$in": [doc["_id"] for _, doc in inserted if doc["_id"] not in kept_ids]}})
+        inserted_ids = kept_ids
+
+    if availability_engine:
+        for doc in docs:
+            if doc["_id"] in inserted_ids:
+                availability_engine.add(doc)
+    return len(inserted_ids)
+
+async def import_assignments(rows: Iterable[Tuple[int, dict]], batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """
+    Importa reservas en lotes. Por lote se hacen dos consultas $in para validar cuentas y
+    recursos, una consulta para las reservas guardadas y un insert_many desordenado, más
+    las operaciones de los cerrojos, que tampoco dependen del número de recursos.
+
+    :param rows: Iterable de tuplas (número de fila, datos), por ejemplo de parse_rows.
+    :return: Diccionario con el número de reservas insertadas y los errores por fila.
+    """
+    inserted = 0
+    errors: List[dict] = []
+    for batch in _batches(rows, batch_size):
+        inserted += await _import_batch(batch, errors)
+    errors.sort(key=lambda error: error["row"])
+    return {"inserted": inserted, "errors": errors}
+
+def detect_format(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return "csv" if extension == ".csv" else "ndjson"
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Importa reservas desde un fichero NDJSON o CSV")
+    parser.add_argument("path", help="Ruta del fichero a importar")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="Formato del fichero (por defecto según la extensión)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    try:
+        # Como al arrancar la aplicación: sin los índices las comprobaciones de solapamiento
+        # recorren la colección entera
+        await ensure_indexes(db)
+        await verify_indexes(db)
+        with open(args.path, newline="", encoding="utf-8") as stream:
+            report = await import_assignments(parse_rows(stream, args.format or detect_format(args.path)), args.batch_size)
+    finally:
+        await registry.close_all()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+# Para ejecutar con `python -m app.services.bulk_import.bulk_import_service reservas.ndjson`
+if __name__ == "__main__":
+    asyncio.run(_main())
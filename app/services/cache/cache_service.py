@@ -0,0 +1,126 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+from bson import ObjectId
+from app.database import db
+from app.services.invalidation import invalidation_service
+from app.services.invalidation.invalidation_service import INVALIDATE_ALL, InvalidationEvent
+
+# Tamaño máximo (0 desactiva la caché) y tiempo de vida de las entradas
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "10000"))
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+# Cachés registradas por nombre, para exponer sus contadores
+caches: Dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """
+    Caché LRU acotada en tamaño con caducidad por entrada.
+
+    Las entradas caducadas se descartan al leerlas; cuando se supera max_size se expulsa
+    la usada hace más tiempo. Los valores se guardan y devuelven como copias superficiales
+    para que quien los use no modifique la entrada compartida.
+    """
+
+    def __init__(self, name: str, max_size: int = CACHE_MAX_SIZE, ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # Claves con cargas en curso: [cargas, generación]. La generación, y _epoch para
+        # invalidate() sin clave, cambian al invalidar; una carga que empezó antes no se
+        # guarda, como en AvailabilityEngine. Solo se siguen estas claves: no crece sin límite.
+        self._loading: Dict[str, list] = {}
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        caches[name] = self
+
+    def get(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def set(self, key: str, value: dict):
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(value))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Optional[str] = None):
+        if key is None:
+            self._epoch += 1
+            self._entries.clear()
+            return
+        key = str(key)
+        if key in self._loading:
+            self._loading[key][1] += 1
+        self._entries.pop(key, None)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        value = self.get(key)
+        if value is not None:
+            return value
+        loading = self._loading.setdefault(key, [0, 0])
+        loading[0] += 1
+        generation = (loading[1], self._epoch)
+        try:
+            value = await loader()
+        finally:
+            loading[0] -= 1
+            if not loading[0]:
+                del self._loading[key]
+        # Los documentos inexistentes no se cachean, ni los leídos antes de una invalidación
+        if value is not None and (loading[1], self._epoch) == generation:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+accounts_cache = TTLCache("accounts")
+resources_cache = TTLCache("resources")
+
+def _invalidator(cache: TTLCache):
+    # Los cambios de otros workers llegan por el bus; sin él solo se invalida lo escrito aquí
+    def on_change(event: InvalidationEvent):
+        cache.invalidate(None if event.operation == INVALIDATE_ALL else event.document_id)
+    return on_change
+
+invalidation_service.subscribe("accounts", _invalidator(accounts_cache))
+invalidation_service.subscribe("resources", _invalidator(resources_cache))
+
+async def get_account_doc(account_id) -> Optional[dict]:
+    # Nunca se cachea el hash de la contraseña
+    return await accounts_cache.get_or_load(
+        str(account_id), lambda: db["accounts"].find_one({"_id": ObjectId(account_id)}, {"password": 0})
+    )
+
+async def get_resource_doc(resource_id) -> Optional[dict]:
+    return await resources_cache.get_or_load(
+        str(resource_id), lambda: db["resources"].find_one({"_id": ObjectId(resource_id)})
+    )
@@ -0,0 +1,65 @@
+import csv
+import io
+import os
+from datetime import datetime
+from typing import AsyncIterator
+from pymongo.asynchronous.cursor import AsyncCursor
+import orjson
+from app.json_utils import json_default
+
+# Documentos que MongoDB devuelve por lote del cursor y bytes acumulados antes de enviar
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", str(64 * 1024)))
+
+# Columnas exportadas, en el orden del CSV; son las que acepta la importación más el id
+EXPORT_FIELDS = ["id", "account_id", "resource_id", "start_time", "end_time", "notes", "status"]
+EXPORT_PROJECTION = {field: 1 for field in EXPORT_FIELDS if field != "id"}
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _ndjson_line(doc: dict) -> bytes:
+    doc["id"] = doc.pop("_id")
+    return orjson.dumps(doc, default=json_default, option=orjson.OPT_APPEND_NEWLINE)
+
+async def export_documents(documents: AsyncCursor, file_format: str) -> AsyncIterator[bytes]:
+    """
+    Convierte los documentos de un cursor en bloques de NDJSON o CSV a medida que llegan.
+
+    Solo se tiene en memoria el lote actual del cursor y un bloque de salida de unos
+    EXPORT_CHUNK_SIZE bytes, así que la memoria no depende del número de filas.
+    """
+    if file_format not in MEDIA_TYPES:
+        raise ValueError(f"Formato no soportado: {file_format}")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    chunk = bytearray()
+    if file_format == "csv":
+        writer.writerow(EXPORT_FIELDS)
+        chunk += buffer.getvalue().encode()
+
+    try:
+        async for doc in documents:
+            if file_format == "csv":
+                buffer.seek(0)
+                buffer.truncate()
+                doc["id"] = doc.pop("_id")
+                writer.writerow([_csv_value(doc.get(field)) for field in EXPORT_FIELDS])
+                chunk += buffer.getvalue().encode()
+            else:
+                chunk += _ndjson_line(doc)
+            if len(chunk) >= EXPORT_CHUNK_SIZE:
+                yield bytes(chunk)
+                chunk.clear()
+    finally:
+        # Si el cliente corta la descarga el cursor del servidor se libera ya, no al caducar
+        await documents.close()
+    if chunk:
+        yield bytes(chunk)
@@ -0,0 +1,46 @@
+from bson import ObjectId
+from app.database import db
+from app.etag_utils import bump_version
+from app.image_utils import IMAGE_RENDITION_FORMATS, IMAGE_RENDITION_SIZES, create_renditions, rendition_urls
+from app.services.blob.blob_service import download_image, release_resource_images, upload_images
+from app.services.cache.cache_service import resources_cache
+from app.services.jobs import jobs_service
+
+RENDITIONS_JOB = "renditions"
+
+resources_collection = db["resources"]
+
+async def enqueue_renditions(resource_id: str, image_url: str):
+    await jobs_service.enqueue(RENDITIONS_JOB, {"resource_id": resource_id, "image_url": image_url})
+
+async def _set_processing_result(resource_id: str, update: dict) -> bool:
+    result = await resources_collection.update_one({"_id": ObjectId(resource_id)}, bump_version({"$set": update}))
+    resources_cache.invalidate(resource_id)
+    return result.matched_count == 1
+
+async def process_renditions(payload: dict):
+    """
+    Genera las versiones de la imagen principal de un recurso a partir de la original ya
+    subida, las sube y las publica en el recurso. Repetirlo es inocuo: las subidas son
+    direccionadas por contenido y el resultado se escribe con $set.
+    """
+    resource_id = payload["resource_id"]
+    data = await download_image(payload["image_url"])
+    renditions = await create_renditions(data)
+    urls = await upload_images([rendition for _, _, rendition in renditions], resource_id)
+    renditions_map = rendition_urls(
+        [(size, image_format, url) for (size, image_format, _), url in zip(renditions, urls)]
+    )
+    updated = await _set_processing_result(resource_id, {
+        "renditions": renditions_map,
+        "thumbnailUrl": renditions_map[str(IMAGE_RENDITION_SIZES[0])][IMAGE_RENDITION_FORMATS[0].lower()],
+        "processing_status": "ready"
+    })
+    if not updated:
+        # El recurso se borró mientras se procesaba: sus versiones no deben quedar referenciadas
+        await release_resource_images(resource_id)
+
+async def renditions_failed(payload: dict, error: str):
+    await _set_processing_result(payload["resource_id"], {"processing_status": "failed"})
+
+jobs_service.register(RENDITIONS_JOB, process_renditions, on_failure=renditions_failed)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+# Bus de invalidación entre workers; necesita un conjunto de réplicas (change streams)
+INVALIDATION_BUS_ENABLED = os.getenv("INVALIDATION_BUS_ENABLED", "false").lower() in ("1", "true", "yes")
+INVALIDATION_MAX_AWAIT_MS = int(os.getenv("INVALIDATION_MAX_AWAIT_MS", "1000"))
+
+WATCHED_COLLECTIONS = ["accounts", "resources", "assignments"]
+
+# Solo el motor de disponibilidad usa el documento tras el cambio, y solo estos campos
+# de las reservas. Se recorta en el servidor: de cuentas y recursos no sale ningún
+# documento ni updateDescription, que llevarían, por ejemplo, los hashes de contraseña.
+ASSIGNMENT_FIELDS = ["_id", "resource_id", "start_time", "end_time", "status"]
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"ns.coll": {"$in": WATCHED_COLLECTIONS}}},
+    {"$project": {
+        "operationType": 1, "ns": 1, "documentKey": 1,
+        "fullDocument": {"$cond": [
+            {"$and": [{"$eq": ["$ns.coll", "assignments"]}, {"$eq": [{"$type": "$fullDocument"}, "object"]}]},
+            {field: f"$fullDocument.{field}" for field in ASSIGNMENT_FIELDS},
+            "$$REMOVE"
+        ]}
+    }},
+]
+
+# Operaciones de un evento: las de los documentos y "invalidate_all" cuando no se sabe qué
+# cambió (colección borrada o renombrada, o cambios perdidos al reanudar)
+DOCUMENT_OPERATIONS = {"insert", "update", "replace", "delete"}
+INVALIDATE_ALL = "invalidate_all"
+
+# Errores del servidor que impiden reanudar desde el token guardado
+CHANGE_STREAM_HISTORY_LOST = 286
+INVALID_RESUME_TOKEN = 260
+
+class InvalidationEvent(NamedTuple):
+    collection: str
+    operation: str
+    document_id: Optional[str] = None
+    # Documento tras el cambio (inserciones y actualizaciones); None en borrados o si ya no existe
+    document: Optional[dict] = None
+
+Subscriber = Callable[[InvalidationEvent], Any]
+
+_subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+_task: Optional[asyncio.Task] = None
+# Último punto del flujo procesado; se conserva entre reconexiones
+resume_token: Optional[dict] = None
+
+def subscribe(collection: str, subscriber: Subscriber):
+    """
+    Registra una función que recibe los eventos de collection generados por cualquier
+    worker, incluido este. Debe ser idempotente y rápida: se llama desde el bucle de eventos.
+    """
+    _subscribers[collection].append(subscriber)
+
+def publish(event: InvalidationEvent):
+    for subscriber in _subscribers.get(event.collection, []):
+        try:
+            subscriber(event)
+        except Exception:
+            logger.exception("Subscriber failed for %s", event)
+
+def to_event(change: dict) -> Optional[InvalidationEvent]:
+    collection = change.get("ns", {}).get("coll")
+    operation = change["operationType"]
+    if operation in DOCUMENT_OPERATIONS:
+        return InvalidationEvent(collection, operation, str(change["documentKey"]["_id"]), change.get("fullDocument"))
+    if operation in ("drop", "rename"):
+        return InvalidationEvent(collection, INVALIDATE_ALL)
+    return None
+
+def _invalidate_everything():
+    for collection in WATCHED_COLLECTIONS:
+        publish(InvalidationEvent(collection, INVALIDATE_ALL))
+
+async def _watch():
+    global resume_token
+    stream = await db.watch(
+        CHANGE_STREAM_PIPELINE,
+        full_document="updateLookup",
+        start_after=resume_token,
+        max_await_time_ms=INVALIDATION_MAX_AWAIT_MS
+    )
+    try:
+        while stream.alive:
+            change = await stream.try_next()
+            if change is not None:
+                event = to_event(change)
+                if event:
+                    publish(event)
+                elif change["operationType"] in ("dropDatabase", "invalidate"):
+                    _invalidate_everything()
+            # El token avanza aunque no haya cambios, así al reanudar no se relee historial
+            resume_token = stream.resume_token
+    finally:
+        await stream.close()
+
+async def _run():
+    global resume_token
+    delay = 0.5
+    while True:
+        try:
+            await _watch()
+            delay = 0.5
+        except OperationFailure as e:
+            if e.code not in (CHANGE_STREAM_HISTORY_LOST, INVALID_RESUME_TOKEN):
+                logger.warning("Change stream failed, retrying in %.1fs: %s", delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            # Los cambios desde el token ya no están en el oplog: se invalida todo y se sigue desde ahora
+            logger.warning("Change stream history lost, invalidating all cached state")
+            resume_token = None
+            _invalidate_everything()
+        except PyMongoError as e:
+            # Mientras no hay conexión no se sabe qué cambió; al volver se reanuda desde el token
+            logger.warning("Change stream disconnected, retrying in %.1fs: %s", delay, e)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+def start():
+    """
+    Empieza a seguir los cambios de WATCHED_COLLECTIONS si INVALIDATION_BUS_ENABLED.
+    Cada worker sigue su propio flujo y avisa a sus suscriptores.
+    """
+    global _task
+    if INVALIDATION_BUS_ENABLED and _task is None:
+        _task = asyncio.create_task(_run())
+
+async def stop():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
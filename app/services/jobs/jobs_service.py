@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+from pymongo import ReturnDocument
+from app.database import db
+
+logger = logging.getLogger(__name__)
+
+# Trabajos en paralelo por proceso, préstamo de un trabajo en curso y reintentos
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+# Un documento por trabajo:
+# {type, payload, status: queued|running|done|failed, attempts, available_at, error, created_at}
+# available_at es cuándo puede tomarse: la hora del siguiente intento si está en cola, o el
+# fin del préstamo si está en curso, de modo que los de un worker caído vuelven a la cola
+jobs_collection = db["jobs"]
+
+Handler = Callable[[dict], Awaitable[None]]
+FailureHandler = Callable[[dict, str], Awaitable[None]]
+
+_handlers: Dict[str, Handler] = {}
+_failure_handlers: Dict[str, FailureHandler] = {}
+_workers: List[asyncio.Task] = []
+_wakeup = asyncio.Event()
+
+def register(job_type: str, handler: Handler, on_failure: Optional[FailureHandler] = None):
+    """
+    Asocia un tipo de trabajo con la corrutina que lo procesa. handler puede ejecutarse
+    más de una vez para el mismo trabajo (reintentos, préstamos caducados), así que debe
+    ser idempotente. on_failure se llama cuando se agotan los intentos.
+    """
+    _handlers[job_type] = handler
+    if on_failure:
+        _failure_handlers[job_type] = on_failure
+
+async def enqueue(job_type: str, payload: dict):
+    now = datetime.now(timezone.utc)
+    await jobs_collection.insert_one({
+        "type": job_type,
+        "payload": payload,
+        "status": "queued",
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now
+    })
+    _wakeup.set()
+
+async def _claim() -> Optional[dict]:
+    now = datetime.now(timezone.utc)
+    return await jobs_collection.find_one_and_update(
+        {"status": {"$in": ["queued", "running"]}, "available_at": {"$lte": now}, "type": {"$in": list(_handlers)}},
+        {"$set": {"status": "running", "available_at": now + timedelta(seconds=JOB_LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        sort=[("available_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def _run(job: dict):
+    try:
+        await _handlers[job["type"]](job["payload"])
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        logger.exception("Job %s (%s) failed, attempt %s", job["_id"], job["type"], job["attempts"])
+        if job["attempts"] < JOB_MAX_ATTEMPTS:
+            # Espera exponencial antes del siguiente intento
+            retry_at = datetime.now(timezone.utc) + timedelta(seconds=JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1))
+            await jobs_collection.update_one({"_id": job["_id"]},
+                                             {"$set": {"status": "queued", "available_at": retry_at, "error": error}})
+            return
+        await jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"status": "failed", "error": error}})
+        if job["type"] in _failure_handlers:
+            await _failure_handlers[job["type"]](job["payload"], error)
+        return
+    await jobs_collection.update_one({"_id": job["_id"]}, {"$set": {"status": "done"}, "$unset": {"error": ""}})
+
+async def _worker():
+    while True:
+        try:
+            job = await _claim()
+        except Exception:
+            logger.exception("Could not claim a job")
+            job = None
+        if job is None:
+            # Sin trabajo: se espera a un enqueue de este proceso o al siguiente sondeo
+            _wakeup.clear()
+            try:
+                await asyncio.wait_for(_wakeup.wait(), JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await _run(job)
+
+def start():
+    for _ in range(JOB_WORKERS - len(_workers)):
+        _workers.append(asyncio.create_task(_worker()))
+
+async def stop():
+    # Los trabajos interrumpidos se retoman cuando caduca su préstamo
+    for worker in _workers:
+        worker.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+
+async def get_job_stats() -> Dict[str, int]:
+    counts = await jobs_collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}])
+    return {doc["_id"]: doc["count"] async for doc in counts}
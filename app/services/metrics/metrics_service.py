@@ -0,0 +1,175 @@
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Las métricas se pueden desactivar por entorno; por defecto están activas
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MONGO_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+MONGO_COMMANDS_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def format_family(name: str, metric_type: str, help_text: str, samples: Iterable[Tuple[str, Sequence[str], Sequence[str], float]]) -> List[str]:
+    """
+    Líneas de una familia de métricas en formato de texto de Prometheus.
+
+    :param samples: Tuplas (sufijo, nombres de etiqueta, valores, valor).
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    for suffix, label_names, label_values, value in samples:
+        lines.append(f"{name}{suffix}{_labels(label_names, label_values)} {value}")
+    return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, label_values: tuple, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        return format_family(self.name, "counter", self.help_text,
+                             (("", self.label_names, values, total) for values, total in sorted(self._values.items())))
+
+class Histogram:
+    """
+    Histograma de buckets fijos. observe() solo incrementa un contador del bucket, así que
+    puede llamarse en cada petición; los acumulados que pide Prometheus se calculan al
+    exportar.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # Por combinación de etiquetas: [cuentas por bucket (+Inf al final), suma]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, label_values: tuple, value: float):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{float(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {cumulative}")
+        return lines
+
+http_requests = Counter("http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "Duración de las peticiones HTTP", ("method", "route"), LATENCY_BUCKETS)
+request_mongo_commands = Histogram("http_request_mongodb_commands", "Comandos de MongoDB por petición HTTP",
+                                   ("method", "route"), MONGO_COMMANDS_BUCKETS)
+request_mongo_latency = Histogram("http_request_mongodb_duration_seconds", "Tiempo en MongoDB por petición HTTP",
+                                  ("method", "route"), LATENCY_BUCKETS)
+mongo_latency = Histogram("mongodb_command_duration_seconds", "Duración de los comandos de MongoDB",
+                          ("command", "collection"), MONGO_LATENCY_BUCKETS)
+mongo_failures = Counter("mongodb_command_failures_total", "Comandos de MongoDB fallidos", ("command", "collection"))
+
+registry = [http_requests, http_latency, request_mongo_commands, request_mongo_latency, mongo_latency, mongo_failures]
+
+# [comandos, segundos] de MongoDB de la petición en curso; None fuera de una petición
+_request_mongo: ContextVar[Optional[list]] = ContextVar("request_mongo", default=None)
+
+class MongoCommandListener(monitoring.CommandListener):
+    """
+    Cuenta y cronometra cada comando de MongoDB por comando y colección, y los suma a la
+    petición HTTP en curso. El cliente asíncrono publica los eventos en la tarea que lanzó
+    la operación, así que la variable de contexto apunta a la petición correcta.
+    """
+
+    def __init__(self):
+        self._collections: Dict[tuple, str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        name = "collection" if event.command_name == "getMore" else event.command_name
+        collection = event.command.get(name)
+        self._collections[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+
+    def _finished(self, event, failed: bool):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1_000_000
+        mongo_latency.observe((event.command_name, collection), seconds)
+        if failed:
+            mongo_failures.inc((event.command_name, collection))
+        request = _request_mongo.get()
+        if request is not None:
+            request[0] += 1
+            request[1] += seconds
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finished(event, failed=False)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finished(event, failed=True)
+
+command_listener = MongoCommandListener()
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI que mide cada petición y la agrupa por la plantilla de su ruta
+    (/resources/{resource_id}), no por la URL concreta, para acotar el número de series.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        mongo = [0, 0.0]
+        token = _request_mongo.set(mongo)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            _request_mongo.reset(token)
+            route = getattr(scope.get("route"), "path_format", "unmatched")
+            labels = (scope["method"], route)
+            http_requests.inc((scope["method"], route, str(status)))
+            http_latency.observe(labels, duration)
+            request_mongo_commands.observe(labels, mongo[0])
+            request_mongo_latency.observe(labels, mongo[1])
+
+def render_metrics(extra: Iterable[str] = ()) -> str:
+    lines: List[str] = []
+    for metric in registry:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,45 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+# Coste de bcrypt y número de hilos dedicados a calcular hashes
+PASSWORD_HASH_ROUNDS = int(os.getenv("PASSWORD_HASH_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    # Configurar el contexto para el hashing de contraseñas. Al fijar min y max al coste actual,
+    # cualquier hash con otro coste se considera desactualizado y se regenera en el login.
+    # passlib se importa con el primer hash, no al arrancar
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=PASSWORD_HASH_ROUNDS,
+        bcrypt__min_rounds=PASSWORD_HASH_ROUNDS,
+        bcrypt__max_rounds=PASSWORD_HASH_ROUNDS,
+    )
+
+# bcrypt libera el GIL, así que un pool de hilos acotado basta para sacar el cálculo del
+# bucle de eventos y limitar cuántos núcleos puede ocupar una avalancha de logins
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, pwd_context().hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña en el pool de hilos.
+
+    :return: Tupla (válida, nuevo hash). El nuevo hash solo se devuelve si la contraseña es
+             válida y el hash guardado usa un coste distinto de PASSWORD_HASH_ROUNDS.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, pwd_context().verify_and_update, plain_password, hashed_password
+    )
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+# Perfilador de consultas lentas; se activa con SLOW_QUERY_PROFILER_ENABLED=true
+SLOW_QUERY_PROFILER_ENABLED = os.getenv("SLOW_QUERY_PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "100"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+
+# Comandos que admiten explain, y dónde lleva cada uno su filtro
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+# Campos de sesión y transporte que no forman parte de la consulta a explicar
+SESSION_FIELDS = {"lsid", "txnNumber", "autocommit", "startTransaction", "readConcern", "writeConcern"}
+
+def query_shape(value: Any) -> Any:
+    """
+    Forma de un filtro: se conservan los campos y operadores y cada valor se sustituye por
+    1, de modo que username="ana" y username="luis" cuentan como la misma consulta.
+    """
+    if isinstance(value, dict):
+        return {key: query_shape(item) if key.startswith("$") or isinstance(item, dict) else 1 for key, item in value.items()}
+    if isinstance(value, list):
+        shapes = [query_shape(item) for item in value if isinstance(item, dict)]
+        return shapes or 1
+    return 1
+
+def command_filter(command_name: str, command: dict) -> dict:
+    if command_name == "find":
+        return command.get("filter") or {}
+    if command_name in ("count", "distinct", "findAndModify"):
+        return command.get("query") or {}
+    if command_name == "aggregate":
+        # Solo un $match al principio del pipeline puede usar un índice
+        pipeline = command.get("pipeline") or [{}]
+        return pipeline[0].get("$match") or {}
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return statements[0].get("q") or {}
+    return {}
+
+def _find_key(document: Any, key: str) -> Optional[dict]:
+    # Las salidas de explain anidan queryPlanner y executionStats a distinta profundidad
+    # según el comando (por ejemplo, dentro de la etapa $cursor de un aggregate)
+    if isinstance(document, dict):
+        if key in document:
+            return document[key]
+        children = document.values()
+    elif isinstance(document, list):
+        children = document
+    else:
+        return None
+    for child in children:
+        found = _find_key(child, key)
+        if found is not None:
+            return found
+    return None
+
+def _plan_stages(plan: Optional[dict]) -> List[dict]:
+    stages = []
+    pending = [plan] if plan else []
+    while pending:
+        stage = pending.pop()
+        stages.append(stage)
+        if "inputStage" in stage:
+            pending.append(stage["inputStage"])
+        pending.extend(stage.get("inputStages", []))
+    return stages
+
+def summarize_explain(explain: dict) -> dict:
+    planner = _find_key(explain, "queryPlanner") or {}
+    winning_plan = planner.get("winningPlan") or {}
+    # Con el motor de ejecución SBE el plan clásico queda bajo queryPlan
+    stages = _plan_stages(winning_plan.get("queryPlan", winning_plan))
+    stats = _find_key(explain, "executionStats") or {}
+    return {
+        "stages": [stage.get("stage") for stage in stages],
+        "indexes": sorted({stage["indexName"] for stage in stages if "indexName" in stage}),
+        "collection_scan": any(stage.get("stage") == "COLLSCAN" for stage in stages),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+    }
+
+class SlowQueryProfiler(monitoring.CommandListener):
+    """
+    Registra los comandos que superan SLOW_QUERY_THRESHOLD_MS con la forma de su filtro.
+    La primera vez que aparece cada forma se pide su explain en segundo plano y se avisa
+    si el plan recorre la colección entera (COLLSCAN).
+    """
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_THRESHOLD_MS, log_size: int = SLOW_QUERY_LOG_SIZE):
+        self.threshold_ms = threshold_ms
+        self.client = None
+        self.recent = deque(maxlen=log_size)
+        # Por (colección, comando, forma): veces, tiempo total y máximo, y resumen del plan
+        self.queries: Dict[Tuple[str, str, str], dict] = {}
+        self._started: Dict[tuple, Tuple[str, dict]] = {}
+
+    def attach(self, client):
+        # Cliente con el que se piden los explain
+        self.client = client
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in EXPLAINABLE_COMMANDS:
+            self._started[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._started.pop((event.connection_id, event.request_id), None)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        started = self._started.pop((event.connection_id, event.request_id), None)
+        duration_ms = event.duration_micros / 1000
+        if started is None or duration_ms < self.threshold_ms:
+            return
+        database_name, command = started
+        collection = command.get(event.command_name)
+        shape = query_shape(command_filter(event.command_name, command))
+        key = (str(collection), event.command_name, repr(shape))
+
+        entry = self.queries.get(key)
+        if entry is None:
+            entry = self.queries[key] = {
+                "collection": collection, "command": event.command_name, "filter_shape": shape,
+                "count": 0, "total_ms": 0.0, "max_ms": 0.0, "plan": None
+            }
+            self._explain_later(entry, database_name, command)
+        entry["count"] += 1
+        entry["total_ms"] += duration_ms
+        entry["max_ms"] = max(entry["max_ms"], duration_ms)
+        self.recent.append({
+            "at": time.time(), "collection": collection, "command": event.command_name,
+            "filter_shape": shape, "duration_ms": round(duration_ms, 3)
+        })
+
+    def _explain_later(self, entry: dict, database_name: str, command: dict):
+        if self.client is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        explained = {key: value for key, value in command.items() if not key.startswith("$") and key not in SESSION_FIELDS}
+        loop.create_task(self._explain(entry, database_name, explained))
+
+    async def _explain(self, entry: dict, database_name: str, command: dict):
+        try:
+            explain = await self.client[database_name].command({"explain": command, "verbosity": "executionStats"})
+        except Exception as e:
+            entry["plan"] = {"error": str(e)}
+            return
+        entry["plan"] = summarize_explain(explain)
+        if entry["plan"]["collection_scan"]:
+            logger.warning("COLLSCAN en %s.%s con filtro %s (%s documentos examinados)",
+                           entry["collection"], entry["command"], entry["filter_shape"], entry["plan"]["docs_examined"])
+
+    def report(self) -> dict:
+        queries = sorted(self.queries.values(), key=lambda entry: entry["total_ms"], reverse=True)
+        return {
+            "threshold_ms": self.threshold_ms,
+            "queries": [{**entry, "total_ms": round(entry["total_ms"], 3), "max_ms": round(entry["max_ms"], 3)} for entry in queries],
+            "recent": list(self.recent),
+        }
+
+slow_query_profiler = SlowQueryProfiler() if SLOW_QUERY_PROFILER_ENABLED else None
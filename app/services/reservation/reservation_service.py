@@ -0,0 +1,180 @@
+import asyncio
+import os
+import random
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Set
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from app.database import db
+
+# Duración del préstamo del cerrojo y tiempo máximo de espera para obtenerlo
+BOOKING_LOCK_LEASE_MS = int(os.getenv("BOOKING_LOCK_LEASE_MS", "10000"))
+BOOKING_LOCK_WAIT_MS = int(os.getenv("BOOKING_LOCK_WAIT_MS", "5000"))
+
+locks_collection = db["resource_locks"]
+
+# Préstamo caducado según el reloj del servidor ($$NOW), el mismo para todos los workers
+_EXPIRED = {"$expr": {"$lt": ["$locked_until", "$$NOW"]}}
+_RENEWED = [{"$set": {"locked_until": {"$add": ["$$NOW", BOOKING_LOCK_LEASE_MS]}}}]
+
+class ResourceLockError(Exception):
+    """El recurso está ocupado por otra reserva en curso."""
+
+class ResourceLockTimeout(ResourceLockError):
+    """No se pudo obtener el cerrojo del recurso dentro de BOOKING_LOCK_WAIT_MS."""
+
+class ResourceLockLost(ResourceLockError):
+    """El préstamo caducó y otro proceso tomó el cerrojo antes de que terminara la escritura."""
+
+def _lock_document(resource_id: str, owner: ObjectId) -> dict:
+    # Un insert no puede usar $$NOW: el primer préstamo usa el reloj local, y una
+    # desviación de unos segundos solo lo acorta o alarga respecto a BOOKING_LOCK_LEASE_MS
+    locked_until = datetime.now(timezone.utc) + timedelta(milliseconds=BOOKING_LOCK_LEASE_MS)
+    return {"_id": resource_id, "locked_until": locked_until, "owner": owner}
+
+async def _acquire(resource_id: str, owner: ObjectId) -> bool:
+    # Si no hay documento se crea; si lo hay, solo se toma cuando su préstamo caducó.
+    # La actualización no es un upsert: MongoDB no admite $expr en el filtro de un upsert.
+    try:
+        await locks_collection.insert_one(_lock_document(resource_id, owner))
+        return True
+    except DuplicateKeyError:
+        pass
+    result = await locks_collection.update_one(
+        {"_id": resource_id, **_EXPIRED},
+        [{"$set": {"locked_until": {"$add": ["$$NOW", BOOKING_LOCK_LEASE_MS]}, "owner": owner}}]
+    )
+    return result.modified_count == 1
+
+async def _wait(deadline: float, delay: float) -> float:
+    # Espera exponencial con jitter para no sincronizar los reintentos
+    await asyncio.sleep(random.uniform(0, min(delay, max(0.0, deadline - asyncio.get_running_loop().time()))))
+    return min(delay * 2, 0.1)
+
+class ResourceLock:
+    """
+    Cerrojo de un recurso obtenido por resource_lock. Cada obtención tiene un propietario
+    nuevo, así que un cerrojo perdido no vuelve nunca al mismo propietario.
+    """
+
+    def __init__(self, resource_id: str):
+        self.resource_id = resource_id
+        self.owner = ObjectId()
+
+    async def renew(self) -> bool:
+        # Aunque el préstamo haya caducado, si nadie lo tomó el propietario sigue siendo este
+        result = await locks_collection.update_one({"_id": self.resource_id, "owner": self.owner}, _RENEWED)
+        return result.matched_count == 1
+
+    async def write(self, operation: Callable[[], Awaitable], rollback: Callable[[Any], Awaitable]):
+        """
+        Ejecuta la escritura protegida por el cerrojo y devuelve su resultado.
+
+        Se comprueba la propiedad antes y después de escribir. Si sigue siendo de este
+        propietario después, lo fue sin interrupción desde que se obtuvo, y cualquier otra
+        escritura en ese intervalo vino de un propietario anterior que deshará la suya.
+        Si se perdió, rollback(resultado) deshace la escritura y se lanza ResourceLockLost.
+        """
+        if not await self.renew():
+            raise ResourceLockLost(self.resource_id)
+        result = await operation()
+        if not await self.renew():
+            await rollback(result)
+            raise ResourceLockLost(self.resource_id)
+        return result
+
+@asynccontextmanager
+async def resource_lock(resource_id) -> AsyncIterator[ResourceLock]:
+    """
+    Cerrojo exclusivo por recurso para el tramo comprobar solapamiento + escribir; la
+    escritura se hace con ResourceLock.write.
+
+    Solo serializa las reservas de un mismo recurso; las de recursos distintos no
+    comparten documento y no compiten entre sí. El préstamo caduca a los
+    BOOKING_LOCK_LEASE_MS por si el proceso que lo tiene muere sin liberarlo.
+    """
+    lock = ResourceLock(str(resource_id))
+    deadline = asyncio.get_running_loop().time() + BOOKING_LOCK_WAIT_MS / 1000
+    delay = 0.005
+    while not await _acquire(lock.resource_id, lock.owner):
+        if asyncio.get_running_loop().time() >= deadline:
+            raise ResourceLockTimeout(lock.resource_id)
+        delay = await _wait(deadline, delay)
+    try:
+        yield lock
+    finally:
+        await locks_collection.delete_one({"_id": lock.resource_id, "owner": lock.owner})
+
+class ResourceLocks:
+    """
+    Cerrojos de muchos recursos a la vez con un mismo propietario, para los lotes de la
+    importación. Se toman y se renuevan con operaciones sobre todo el lote, así que el
+    número de viajes a MongoDB no depende de cuántos recursos tenga.
+    """
+
+    def __init__(self):
+        self.owner = ObjectId()
+        self.held: Set[str] = set()
+
+    async def _try_acquire(self, resource_ids: Set[str]):
+        # 1. Los que no tienen documento: un insert_many desordenado
+        try:
+            await locks_collection.insert_many([_lock_document(resource_id, self.owner) for resource_id in resource_ids],
+                                               ordered=False)
+            self.held |= resource_ids
+            return
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+        # 2. Los que ya existían: se toman los caducados y se lee cuáles son ahora de este propietario
+        await locks_collection.update_many({"_id": {"$in": list(resource_ids)}, **_EXPIRED},
+                                           [{"$set": {"locked_until": {"$add": ["$$NOW", BOOKING_LOCK_LEASE_MS]},
+                                                      "owner": self.owner}}])
+        self.held |= {doc["_id"] async for doc in locks_collection.find(
+            {"_id": {"$in": list(resource_ids)}, "owner": self.owner}, {"_id": 1})}
+
+    async def acquire(self, resource_ids: Iterable) -> Set[str]:
+        """
+        Reintenta los cerrojos ocupados hasta BOOKING_LOCK_WAIT_MS y devuelve los obtenidos;
+        quien llama descarta el trabajo de los demás recursos.
+        """
+        pending = {str(resource_id) for resource_id in resource_ids}
+        deadline = asyncio.get_running_loop().time() + BOOKING_LOCK_WAIT_MS / 1000
+        delay = 0.005
+        while True:
+            await self._try_acquire(pending)
+            pending -= self.held
+            if not pending or asyncio.get_running_loop().time() >= deadline:
+                return self.held
+            delay = await _wait(deadline, delay)
+
+    async def renew(self) -> Set[str]:
+        """
+        Alarga el préstamo de los cerrojos que siguen siendo de este propietario y devuelve
+        cuáles son. Se llama antes y después de escribir, como en ResourceLock.write: un
+        cerrojo caducado y tomado por otro proceso ya no protege sus filas.
+        """
+        if not self.held:
+            return self.held
+        result = await locks_collection.update_many({"_id": {"$in": list(self.held)}, "owner": self.owner}, _RENEWED)
+        if result.matched_count < len(self.held):
+            self.held = {doc["_id"] async for doc in locks_collection.find(
+                {"_id": {"$in": list(self.held)}, "owner": self.owner}, {"_id": 1})}
+        return self.held
+
+    async def release(self):
+        if self.held:
+            await locks_collection.delete_many({"_id": {"$in": list(self.held)}, "owner": self.owner})
+            self.held = set()
+
+@asynccontextmanager
+async def resource_locks(resource_ids: Iterable):
+    # La espera está acotada y después se sigue con los cerrojos obtenidos, así que dos lotes
+    # con recursos en común no pueden bloquearse mutuamente aunque no los tomen en orden
+    locks = ResourceLocks()
+    try:
+        await locks.acquire(resource_ids)
+        yield locks
+    finally:
+        await locks.release()
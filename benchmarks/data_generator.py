@@ -0,0 +1,140 @@
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+from bson import ObjectId
+
+# Contraseña de todas las cuentas generadas, para el escenario de login
+BENCH_PASSWORD = "bench-password"
+
+RESOURCE_TYPES = ["room", "desk", "court", "vehicle"]
+# Duraciones en minutos y su peso: predominan las reservas de una hora
+DURATIONS = [30, 60, 90, 120, 180, 240]
+DURATION_WEIGHTS = [15, 40, 15, 15, 10, 5]
+STATUSES = ["pending", "active", "cancelled", "completed"]
+STATUS_WEIGHTS = [20, 40, 10, 30]
+# Horario en el que empiezan las reservas y peso de cada día de la semana (lunes = 0)
+OPENING_HOUR = 8
+CLOSING_HOUR = 20
+WEEKDAY_WEIGHTS = [10, 10, 10, 10, 9, 4, 2]
+INSERT_BATCH_SIZE = 10000
+
+def _bookings_per_resource(bookings: int, resources: int, rng: random.Random) -> List[int]:
+    # Popularidad con forma de Zipf: unos pocos recursos concentran muchas reservas
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(resources)]
+    counts = [0] * resources
+    for index in rng.choices(range(resources), weights=weights, k=bookings):
+        counts[index] += 1
+    return counts
+
+def _next_day(day: datetime, rng: random.Random) -> datetime:
+    # Se salta días con probabilidad inversa a su peso para que los fines de semana tengan menos reservas
+    while True:
+        day += timedelta(days=1)
+        if rng.random() * 10 < WEEKDAY_WEIGHTS[day.weekday()]:
+            return day
+
+def _resource_bookings(resource_id: ObjectId, count: int, clients: List[ObjectId], start: datetime,
+                       rng: random.Random, version: dict) -> List[dict]:
+    """
+    Reservas sin solapes de un recurso, una detrás de otra desde start, en horario de
+    apertura, con huecos de duración exponencial y alineadas a cuartos de hora.
+    """
+    bookings = []
+    day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    current = day + timedelta(hours=OPENING_HOUR)
+    for _ in range(count):
+        gap = int(rng.expovariate(1 / 90) // 15) * 15
+        duration = rng.choices(DURATIONS, weights=DURATION_WEIGHTS)[0]
+        begin = current + timedelta(minutes=gap)
+        if begin + timedelta(minutes=duration) > day + timedelta(hours=CLOSING_HOUR):
+            day = _next_day(day, rng)
+            latest = (CLOSING_HOUR - OPENING_HOUR) * 60 - duration
+            begin = day + timedelta(hours=OPENING_HOUR, minutes=min(int(rng.expovariate(1 / 60) // 15) * 15, latest))
+        end = begin + timedelta(minutes=duration)
+        bookings.append({
+            "account_id": rng.choice(clients),
+            "resource_id": resource_id,
+            "start_time": begin,
+            "end_time": end,
+            "notes": None,
+            "status": rng.choices(STATUSES, weights=STATUS_WEIGHTS)[0],
+            **version
+        })
+        current = end
+    return bookings
+
+async def _insert(collection, documents: List[dict]):
+    for start in range(0, len(documents), INSERT_BATCH_SIZE):
+        await collection.insert_many(documents[start:start + INSERT_BATCH_SIZE], ordered=False)
+
+async def generate(database, accounts: int, resources: int, bookings: int, password_hash: str,
+                   seed: int = 0, start: datetime = datetime(2024, 1, 1)) -> Dict[str, list]:
+    """
+    Llena database con accounts cuentas (una de cada diez es empresa), resources
+    recursos repartidos entre las empresas y bookings reservas a partir de start.
+
+    Con la misma semilla se generan siempre los mismos datos. Todas las cuentas usan
+    password_hash, que debe corresponder a BENCH_PASSWORD.
+
+    :return: Identificadores generados, para que los escenarios elijan sus datos.
+    """
+    from app.services.availability.availability_service import MAX_DURATION_FIELD
+
+    rng = random.Random(seed)
+    version = {"version": 1, "updated_at": datetime.now(timezone.utc)}
+
+    account_docs = []
+    for index in range(accounts):
+        account_type = "company" if index % 10 == 0 else "client"
+        account_docs.append({
+            "_id": ObjectId(),
+            "name": f"{account_type.title()} {index}",
+            "email": f"user{index}@bench.example.com",
+            "username": f"user{index}",
+            "password": password_hash,
+            "account_type": account_type,
+            "thumbnailUrl": ""
+        })
+    companies = [doc["_id"] for doc in account_docs if doc["account_type"] == "company"]
+    clients = [doc["_id"] for doc in account_docs if doc["account_type"] == "client"] or companies
+
+    resource_docs = []
+    for index in range(resources):
+        resource_docs.append({
+            "_id": ObjectId(),
+            "name": f"Recurso {index}",
+            "account_id": rng.choice(companies),
+            "info": ["Wifi"],
+            "type": rng.choice(RESOURCE_TYPES),
+            "notes": [],
+            "thumbnailUrl": "",
+            "rawImagesUrls": [],
+            "price_per_day": round(rng.uniform(10, 200), 2),
+            **version
+        })
+
+    booking_docs = []
+    for resource, count in zip(resource_docs, _bookings_per_resource(bookings, resources, rng)):
+        resource_bookings = _resource_bookings(resource["_id"], count, clients, start, rng, version)
+        if resource_bookings:
+            # Lo que mantienen las rutas de escritura con record_durations
+            resource[MAX_DURATION_FIELD] = max((doc["end_time"] - doc["start_time"]) // timedelta(milliseconds=1)
+                                               for doc in resource_bookings)
+        booking_docs.extend(resource_bookings)
+
+    await _insert(database["accounts"], account_docs)
+    await _insert(database["resources"], resource_docs)
+    await _insert(database["assignments"], booking_docs)
+
+    return {
+        "usernames": [doc["username"] for doc in account_docs],
+        "companies": companies,
+        # Empresas con algún recurso: create_resource exige que la cuenta ya tenga uno
+        "resource_owners": sorted({doc["account_id"] for doc in resource_docs}),
+        "clients": clients,
+        # De más a menos reservas, según la distribución de popularidad
+        "resources": [doc["_id"] for doc in resource_docs],
+        "first_booking": min((doc["start_time"] for doc in booking_docs), default=start),
+        "last_booking": max((doc["end_time"] for doc in booking_docs), default=start),
+        "bookings": len(booking_docs),
+    }
@@ -0,0 +1,71 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from typing import Optional
+from pymongo import MongoClient
+
+# Nombre del conjunto de réplicas del mongod temporal: con un solo nodo basta para que
+# estén disponibles las funciones que solo existen en réplicas (change streams)
+REPLICA_SET = "bench"
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class LocalMongo:
+    """
+    mongod desechable sobre un directorio temporal, para medir sin depender de un
+    servidor compartido. Se usa como gestor de contexto y lo borra todo al salir.
+    """
+
+    def __init__(self, mongod: Optional[str] = None):
+        self.mongod = mongod or shutil.which("mongod")
+        if not self.mongod:
+            raise RuntimeError("No se encontró mongod en el PATH; indique --mongod o --mongodb-uri")
+        self.port = _free_port()
+        self.uri = f"mongodb://127.0.0.1:{self.port}/?directConnection=true"
+        self.dbpath: Optional[str] = None
+        self.process: Optional[subprocess.Popen] = None
+
+    def __enter__(self) -> "LocalMongo":
+        self.dbpath = tempfile.mkdtemp(prefix="reservify-bench-mongo-")
+        self.process = subprocess.Popen(
+            [self.mongod, "--dbpath", self.dbpath, "--port", str(self.port), "--bind_ip", "127.0.0.1",
+             "--replSet", REPLICA_SET, "--wiredTigerCacheSizeGB", "1", "--quiet"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        with MongoClient(self.uri, serverSelectionTimeoutMS=30000) as client:
+            client.admin.command("ping")
+            client.admin.command("replSetInitiate", {"_id": REPLICA_SET, "members": [{"_id": 0, "host": f"127.0.0.1:{self.port}"}]})
+            deadline = time.monotonic() + 30
+            while not client.admin.command("hello").get("isWritablePrimary"):
+                if time.monotonic() > deadline:
+                    raise RuntimeError("El mongod temporal no llegó a primario")
+                time.sleep(0.1)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.process:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        if self.dbpath:
+            shutil.rmtree(self.dbpath, ignore_errors=True)
+
+def configure_app(mongodb_uri: str, database_name: str, blob_root: str):
+    """
+    Variables de entorno que la aplicación lee al importarse: debe llamarse antes de
+    importar app.main. BLOB_PUBLIC_URL y LOG_LEVEL se respetan si ya están definidas.
+    """
+    os.environ["MONGODB_URI"] = mongodb_uri
+    os.environ["DATABASE_NAME"] = database_name
+    os.environ["BLOB_BACKEND"] = "local"
+    os.environ["BLOB_LOCAL_ROOT"] = blob_root
+    os.environ.setdefault("BLOB_PUBLIC_URL", "http://bench/blobs")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
@@ -0,0 +1,93 @@
+import argparse
+import importlib
+import json
+import multiprocessing
+import resource
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Callable, Dict, List
+
+def full_decode_png(data: bytes):
+    # Camino anterior a las versiones: decodificación completa, copia y miniatura PNG
+    from PIL import Image
+
+    image = Image.open(BytesIO(data)).copy()
+    image.thumbnail((128, 128))
+    image.save(BytesIO(), format="PNG")
+
+def renditions(data: bytes):
+    from app.image_utils import IMAGE_RENDITION_FORMATS, IMAGE_RENDITION_QUALITY, IMAGE_RENDITION_SIZES, render_renditions
+
+    render_renditions(data, IMAGE_RENDITION_SIZES, IMAGE_RENDITION_FORMATS, IMAGE_RENDITION_QUALITY)
+
+PIPELINES: Dict[str, Callable[[bytes], None]] = {"renditions": renditions, "full_decode_png": full_decode_png}
+
+def _peak_rss_kb() -> int:
+    # VmHWM es el pico del propio proceso; ru_maxrss en Linux arrastra el del padre tras exec
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def _reset_peak_rss():
+    # En Linux, escribir 5 en clear_refs pone el pico de memoria en el uso actual
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+def _measure(pipeline: str, data: bytes) -> dict:
+    """
+    Se ejecuta en un proceso nuevo por imagen, para que el pico de memoria corresponda a
+    una sola imagen. Los módulos se importan antes de la línea base para no contarlos.
+    """
+    for module in ("PIL.Image", "app.image_utils"):
+        importlib.import_module(module)
+
+    _reset_peak_rss()
+    baseline_kb = _peak_rss_kb()
+    cpu_start = time.process_time()
+    PIPELINES[pipeline](data)
+    cpu_seconds = time.process_time() - cpu_start
+    peak_kb = _peak_rss_kb()
+    return {"cpu_ms": cpu_seconds * 1000, "peak_rss_mb": peak_kb / 1024, "rss_increase_mb": (peak_kb - baseline_kb) / 1024}
+
+def _summary(values: List[float]) -> dict:
+    return {"median": round(statistics.median(values), 1), "max": round(max(values), 1)}
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el tiempo de CPU y el pico de memoria por imagen al generar las versiones")
+    parser.add_argument("--images", type=int, default=5)
+    parser.add_argument("--width", type=int, default=6000, help="Ancho de las fotos generadas (6000x4000: cámara de 24 MP)")
+    parser.add_argument("--height", type=int, default=4000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from benchmarks.scenarios import _photo
+
+    photos = [_photo(args.seed * 1000 + index, args.width, args.height) for index in range(args.images)]
+    report = {
+        "images": args.images,
+        "resolution": f"{args.width}x{args.height}",
+        "jpeg_mb": round(statistics.fmean(len(photo) for photo in photos) / 2 ** 20, 2),
+        "pipelines": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    for pipeline in PIPELINES:
+        runs = []
+        for photo in photos:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                runs.append(executor.submit(_measure, pipeline, photo).result())
+        report["pipelines"][pipeline] = {key: _summary([run[key] for run in runs]) for key in runs[0]}
+    print(json.dumps(report, indent=2))
+
+# Para ejecutar con `python -m benchmarks.images`; no necesita MongoDB
+if __name__ == "__main__":
+    main()
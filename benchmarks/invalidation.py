@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from benchmarks.environment import LocalMongo, configure_app
+
+WAIT_TIMEOUT_SECONDS = 10
+
+async def _wait_for(condition, timeout: float = WAIT_TIMEOUT_SECONDS) -> float:
+    # Segundos hasta que condition() se cumple; lanza TimeoutError si no llega a cumplirse
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError
+        await asyncio.sleep(0.001)
+    return time.perf_counter() - start
+
+async def run_checks(writer, events: int) -> dict:
+    """
+    Escribe con un cliente independiente, como lo haría otro worker, y comprueba que este
+    proceso se entera por el bus: latencia de propagación, invalidación de la caché y del
+    motor de disponibilidad, y reanudación desde el token tras una parada.
+    """
+    from bson import ObjectId
+    from app.services.availability.availability_service import ResourceIntervals, availability_engine
+    from app.services.cache.cache_service import accounts_cache, get_account_doc
+    from app.services.invalidation import invalidation_service
+    from app.services.invalidation.invalidation_service import INVALIDATE_ALL
+
+    received = {}
+    invalidated = []
+    def on_resource(event):
+        if event.operation == INVALIDATE_ALL:
+            invalidated.append(event.collection)
+        else:
+            received.setdefault(event.document_id, time.perf_counter())
+    invalidation_service.subscribe("resources", on_resource)
+    # Documentos que llegan con los eventos de cuentas: deben llegar vacíos
+    account_documents = []
+    invalidation_service.subscribe("accounts", lambda event: account_documents.append(event.document))
+
+    failures = []
+    report = {}
+    invalidation_service.start()
+    try:
+        # El flujo empieza a seguirse al abrirse: se espera a que haya token
+        await _wait_for(lambda: invalidation_service.resume_token is not None)
+
+        # 1. Latencia de propagación
+        lags = []
+        for _ in range(events):
+            resource_id = ObjectId()
+            sent = time.perf_counter()
+            await writer.resources.insert_one({"_id": resource_id, "name": "bench"})
+            await _wait_for(lambda: str(resource_id) in received)
+            lags.append((received[str(resource_id)] - sent) * 1000)
+        lags.sort()
+        report["propagation_ms"] = {
+            "p50": round(statistics.median(lags), 2),
+            "p99": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))], 2),
+            "max": round(lags[-1], 2),
+        }
+
+        # 2. Caché de cuentas
+        account_id = (await writer.accounts.insert_one({"name": "antes", "account_type": "client"})).inserted_id
+        await get_account_doc(account_id)
+        await writer.accounts.update_one({"_id": account_id}, {"$set": {"name": "después"}})
+        try:
+            await _wait_for(lambda: str(account_id) not in accounts_cache._entries)
+            if (await get_account_doc(account_id))["name"] != "después":
+                failures.append("la caché de cuentas devuelve el documento antiguo")
+        except TimeoutError:
+            failures.append("la caché de cuentas no se invalidó")
+        if any(document is not None for document in account_documents):
+            failures.append("los eventos de cuentas incluyen el documento")
+
+        # 3. Motor de disponibilidad
+        resource_id = ObjectId()
+        start = datetime(2030, 1, 1, 10)
+        end = start + timedelta(hours=1)
+        await availability_engine.is_overlapping(resource_id, start, end)
+        assignment = {"resource_id": resource_id, "start_time": start, "end_time": end, "status": "confirmed"}
+        await writer.assignments.insert_one(assignment)
+        try:
+            await _wait_for(lambda: str(assignment["_id"]) in availability_engine._resources.get(str(resource_id), ()))
+        except TimeoutError:
+            failures.append("el motor de disponibilidad no recibió la reserva nueva")
+        # Una actualización llega con el documento posterior recortado a los campos del motor
+        moved_start = end + timedelta(hours=1)
+        await writer.assignments.update_one({"_id": assignment["_id"]},
+                                            {"$set": {"start_time": moved_start, "end_time": moved_start + timedelta(hours=1)}})
+        try:
+            await _wait_for(lambda: not availability_engine._resources.get(str(resource_id), ResourceIntervals()).overlaps(start, end))
+            if not await availability_engine.is_overlapping(resource_id, moved_start, moved_start + timedelta(minutes=30)):
+                failures.append("el motor de disponibilidad no tiene el nuevo horario de la reserva")
+        except TimeoutError:
+            failures.append("el motor de disponibilidad no recibió la actualización")
+        await writer.assignments.delete_one({"_id": assignment["_id"]})
+        try:
+            await _wait_for(lambda: str(assignment["_id"]) not in availability_engine._resources.get(str(resource_id), ()))
+        except TimeoutError:
+            failures.append("el motor de disponibilidad no recibió el borrado")
+
+        # 4. Reanudación: lo escrito con el bus parado llega al volver a arrancarlo
+        await invalidation_service.stop()
+        missed_id = (await writer.resources.insert_one({"name": "mientras estaba parado"})).inserted_id
+        invalidation_service.start()
+        try:
+            report["resume_ms"] = round(await _wait_for(lambda: str(missed_id) in received) * 1000, 2)
+        except TimeoutError:
+            failures.append("tras reanudar no llegó el cambio hecho con el bus parado")
+
+        # 5. Borrar la colección invalida todo lo cacheado de ella
+        await writer.resources.drop()
+        try:
+            await _wait_for(lambda: "resources" in invalidated)
+        except TimeoutError:
+            failures.append("borrar la colección no generó una invalidación completa")
+    except TimeoutError:
+        failures.append("el bus no entregó los eventos a tiempo")
+    finally:
+        await invalidation_service.stop()
+
+    report["failures"] = failures
+    return report
+
+async def _main(args) -> dict:
+    from pymongo import AsyncMongoClient
+    from app import registry
+
+    writer_client = AsyncMongoClient(os.environ["MONGODB_URI"])
+    try:
+        return await run_checks(writer_client[os.environ["DATABASE_NAME"]], args.events)
+    finally:
+        await writer_client.close()
+        await registry.close_all()
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprueba y mide el bus de invalidación sobre un conjunto de réplicas")
+    parser.add_argument("--events", type=int, default=200, help="Cambios con los que se mide la latencia")
+    parser.add_argument("--mongodb-uri", help="Conjunto de réplicas existente; por defecto se arranca un mongod temporal")
+    parser.add_argument("--mongod", help="Ruta del binario mongod (por defecto el del PATH)")
+    args = parser.parse_args()
+
+    def run(uri: str) -> dict:
+        with tempfile.TemporaryDirectory(prefix="reservify-bench-blobs-") as blob_root:
+            configure_app(uri, "reservify_invalidation", blob_root)
+            # Deben estar definidas antes de importar la aplicación
+            os.environ["INVALIDATION_BUS_ENABLED"] = "true"
+            os.environ["AVAILABILITY_ENGINE_ENABLED"] = "true"
+            return asyncio.run(_main(args))
+
+    if args.mongodb_uri:
+        report = run(args.mongodb_uri)
+    else:
+        with LocalMongo(args.mongod) as mongo:
+            report = run(mongo.uri)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report["failures"] else 0)
+
+# Para ejecutar con `python -m benchmarks.invalidation`; termina con código 1 si alguna comprobación falla
+if __name__ == "__main__":
+    main()
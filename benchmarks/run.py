@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from benchmarks.environment import LocalMongo, configure_app
+
+def _commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+async def run_scenarios(args) -> dict:
+    # La aplicación lee su configuración al importarse: se importa ya configurado el entorno
+    import httpx
+    from app import registry
+    from app.database import db, get_client
+    from app.main import app
+    from app.services.password.password_service import hash_password
+    from benchmarks.data_generator import BENCH_PASSWORD, generate
+    from benchmarks.scenarios import SCENARIOS
+    from benchmarks.transport import StreamingASGITransport
+
+    selected = args.scenarios or list(SCENARIOS)
+    unknown = set(selected) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Escenarios desconocidos: {', '.join(sorted(unknown))}")
+
+    results = {}
+    try:
+        async with app.router.lifespan_context(app):
+            started = time.perf_counter()
+            dataset = await generate(db, args.accounts, args.resources, args.bookings,
+                                     await hash_password(BENCH_PASSWORD), seed=args.seed)
+            generation_seconds = round(time.perf_counter() - started, 3)
+
+            # Las respuestas llegan por bloques, como de un servidor: las medidas de memoria valen
+            transport = StreamingASGITransport(app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for name in selected:
+                    scenario, default_iterations = SCENARIOS[name]
+                    iterations = args.iterations or default_iterations
+                    results[name] = await scenario(client, dataset, iterations, args.concurrency, args.seed)
+                    print(f"{name}: {json.dumps(results[name])}", file=sys.stderr)
+        if not args.keep_data:
+            await get_client().drop_database(db.name)
+    finally:
+        await registry.close_all()
+
+    return {
+        "commit": _commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "parameters": {
+            "accounts": args.accounts, "resources": args.resources, "bookings": args.bookings,
+            "seed": args.seed, "concurrency": args.concurrency, "iterations": args.iterations,
+        },
+        "data_generation_seconds": generation_seconds,
+        "scenarios": results,
+        # Comprobaciones que fallaron en los escenarios que verifican además de medir
+        "failures": {name: result["failures"] for name, result in results.items() if result.get("failures")},
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de la API de Reservify contra un MongoDB y un almacén de imágenes locales")
+    parser.add_argument("--mongodb-uri", help="Servidor a usar; por defecto se arranca un mongod temporal")
+    parser.add_argument("--mongod", help="Ruta del binario mongod (por defecto el del PATH)")
+    parser.add_argument("--database", default="reservify_bench")
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--resources", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--iterations", type=int, help="Operaciones por escenario (por defecto las de cada escenario)")
+    parser.add_argument("--scenario", dest="scenarios", action="append", help="Escenario a ejecutar; se puede repetir")
+    parser.add_argument("--keep-data", action="store_true", help="No borra la base de datos al terminar")
+    parser.add_argument("--output", help="Fichero JSON de resultados (por defecto la salida estándar)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="reservify-bench-blobs-") as blob_root:
+        if args.mongodb_uri:
+            configure_app(args.mongodb_uri, args.database, blob_root)
+            report = asyncio.run(run_scenarios(args))
+        else:
+            with LocalMongo(args.mongod) as mongo:
+                configure_app(mongo.uri, args.database, blob_root)
+                report = asyncio.run(run_scenarios(args))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(1 if report["failures"] else 0)
+
+# Para ejecutar con `python -m benchmarks.run --output resultados.json`; termina con código 1 si
+# alguna comprobación de los escenarios falla
+if __name__ == "__main__":
+    main()
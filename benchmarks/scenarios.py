@@ -0,0 +1,588 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timedelta
+from io import BytesIO
+from typing import Awaitable, Callable, Dict, List
+from PIL import Image
+from app.assignement_utils import DATE_FORMAT
+from benchmarks.data_generator import BENCH_PASSWORD
+
+Operation = Callable[[int], Awaitable[int]]
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def summarize(latencies: List[float], statuses: Counter, wall_seconds: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "operations": len(ordered),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_per_second": round(len(ordered) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(ordered) * 1000, 3) if ordered else 0.0,
+            "p50": round(_percentile(ordered, 0.50) * 1000, 3),
+            "p95": round(_percentile(ordered, 0.95) * 1000, 3),
+            "p99": round(_percentile(ordered, 0.99) * 1000, 3),
+            "max": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        },
+    }
+
+async def measure(operation: Operation, iterations: int, concurrency: int, warmup: int = 0) -> dict:
+    """
+    Ejecuta operation(i) para i en range(iterations) con concurrency tareas a la vez y
+    resume sus latencias. operation devuelve el código HTTP obtenido.
+    """
+    for index in range(warmup):
+        await operation(iterations + index)
+
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+
+    async def worker(first: int):
+        for index in range(first, iterations, concurrency):
+            start = time.perf_counter()
+            status = await operation(index)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(first) for first in range(concurrency)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+def _format(moment: datetime) -> str:
+    return moment.strftime(DATE_FORMAT)
+
+def _booking(client_id: str, resource_id: str, start: datetime, minutes: int = 45) -> dict:
+    return {
+        "account_id": client_id,
+        "resource_id": resource_id,
+        "start_time": start.isoformat() + "Z",
+        "end_time": (start + timedelta(minutes=minutes)).isoformat() + "Z",
+    }
+
+async def count_double_bookings(resource_id, since: datetime) -> int:
+    # Reservas que empiezan antes de que termine la anterior del mismo recurso
+    from app.database import db
+
+    previous_end = None
+    overlaps = 0
+    async for booking in db["assignments"].find({"resource_id": resource_id, "start_time": {"$gte": since}},
+                                                {"start_time": 1, "end_time": 1}).sort("start_time", 1):
+        if previous_end is not None and booking["start_time"] < previous_end:
+            overlaps += 1
+        previous_end = max(previous_end or booking["end_time"], booking["end_time"])
+    return overlaps
+
+async def stalled_lock_holder(client, dataset: dict, resource_id: str, slot: datetime) -> List[str]:
+    """
+    Un titular del cerrojo que se detiene más allá del préstamo: otra petición toma el
+    cerrojo caducado y reserva el hueco, y la escritura del primero debe rechazarse.
+    """
+    from bson import ObjectId
+    from app.database import db
+    from app.services.reservation.reservation_service import ResourceLockLost, locks_collection, resource_lock
+
+    collection = db["assignments"]
+    stalled_doc = {"account_id": ObjectId(dataset["clients"][0]), "resource_id": ObjectId(resource_id),
+                   "start_time": slot, "end_time": slot + timedelta(minutes=45), "status": "pending"}
+    failures = []
+    async with resource_lock(resource_id) as stalled:
+        # El préstamo caduca sin esperar BOOKING_LOCK_LEASE_MS
+        await locks_collection.update_one({"_id": stalled.resource_id}, {"$set": {"locked_until": datetime(2000, 1, 1)}})
+        response = await client.post("/assignments/", json=_booking(str(dataset["clients"][0]), resource_id, slot))
+        if response.status_code != 201:
+            failures.append(f"la petición que toma un cerrojo caducado obtuvo {response.status_code}")
+        try:
+            await stalled.write(lambda: collection.insert_one(stalled_doc),
+                                lambda result: collection.delete_one({"_id": result.inserted_id}))
+            failures.append("la escritura de un cerrojo perdido se aceptó")
+        except ResourceLockLost:
+            pass
+    if await count_double_bookings(ObjectId(resource_id), slot - timedelta(hours=1)):
+        failures.append("reservas solapadas tras perder el cerrojo")
+    return failures
+
+async def create_assignment_contention(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                                       requests_per_slot: int = 8, storm_concurrency: int = 500) -> dict:
+    """
+    Prueba de carga de las escrituras de reservas.
+
+    - contended: iterations peticiones, storm_concurrency a la vez, sobre el recurso más reservado; cada
+      hueco lo piden requests_per_slot peticiones, con inicios desplazados para que
+      también choquen reservas que solo se solapan en parte. Al terminar no puede haber
+      dos reservas solapadas en la base de datos.
+    - uncontended: las mismas altas repartidas entre el resto de recursos, sin la carga
+      anterior y durante ella. El throughput no debe caer por la carga sobre otro recurso.
+    - Además, stalled_lock_holder: un titular que pierde el cerrojo no llega a escribir.
+    """
+    from bson import ObjectId
+
+    rng = random.Random(seed)
+    contended_resource = str(dataset["resources"][0])
+    others = [str(resource_id) for resource_id in dataset["resources"][1:]] or [contended_resource]
+    clients = [str(client_id) for client_id in dataset["clients"]]
+    # Después de las reservas generadas, para que los huecos solo compitan entre sí
+    base = dataset["last_booking"].replace(minute=0, second=0, microsecond=0) + timedelta(days=365)
+    offsets = [rng.choice([0, 15, 30]) for _ in range(iterations)]
+
+    async def contended(index: int) -> int:
+        slot = base + timedelta(hours=index // requests_per_slot, minutes=offsets[index])
+        response = await client.post("/assignments/", json=_booking(clients[index % len(clients)], contended_resource, slot))
+        return response.status_code
+
+    def uncontended(first_day: int):
+        # Cada operación tiene su propio hueco en uno de los demás recursos
+        async def operation(index: int) -> int:
+            slot = base + timedelta(days=first_day, hours=index // len(others))
+            response = await client.post("/assignments/", json=_booking(clients[index % len(clients)],
+                                                                        others[index % len(others)], slot))
+            return response.status_code
+        return operation
+
+    # Sin calentamiento: crearía reservas fuera de la secuencia de huecos
+    baseline = await measure(uncontended(30000), iterations, concurrency)
+    storm, during_storm = await asyncio.gather(
+        measure(contended, iterations, storm_concurrency),
+        measure(uncontended(60000), iterations, concurrency)
+    )
+
+    double_bookings = await count_double_bookings(ObjectId(contended_resource), base)
+    for resource_id in others:
+        double_bookings += await count_double_bookings(ObjectId(resource_id), base)
+    ratio = (during_storm["throughput_per_second"] / baseline["throughput_per_second"]
+             if baseline["throughput_per_second"] else 0.0)
+
+    failures = await stalled_lock_holder(client, dataset, contended_resource, base + timedelta(days=90000))
+    if double_bookings:
+        failures.append(f"{double_bookings} reservas solapadas tras la carga")
+    if storm["statuses"].get("500") or during_storm["statuses"].get("500") or baseline["statuses"].get("500"):
+        failures.append("respuestas 500 durante la carga")
+    return {
+        "contended": storm,
+        "uncontended": baseline,
+        "uncontended_during_contention": during_storm,
+        "uncontended_throughput_ratio": round(ratio, 3),
+        "double_bookings": double_bookings,
+        "failures": failures,
+    }
+
+async def overlap_query_plan(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                             max_keys_examined: int = 1000, max_extra_keys: int = 16) -> dict:
+    """
+    Prueba de regresión del plan de las consultas de solapamiento de is_overlapping y
+    check_availability, con la misma cota de duración máxima que usan las rutas: explain
+    con executionStats en recursos al azar, sobre dos tipos de hueco.
+
+    - tail: huecos de la última semana de reservas del recurso. Cada consulta (limit 1)
+      debe resolverse con uno de los índices de solapamiento (IXSCAN, sin COLLSCAN)
+      examinando como mucho max_keys_examined claves.
+    - middle: huecos alrededor de una reserva a mitad del historial, sin limit. Las claves
+      examinadas no pueden superar en más de max_extra_keys a las reservas devueltas,
+      sea cual sea el número de reservas anteriores o posteriores del recurso.
+    """
+    from app.assignement_utils import get_overlapping_query
+    from app.database import db
+    from app.indexes import REQUIRED_INDEXES
+    from app.services.availability.availability_service import get_max_duration
+    from app.services.profiler.profiler_service import summarize_explain
+
+    assignments = db["assignments"]
+    overlap_indexes = {name.split(".", 1)[1] for name in REQUIRED_INDEXES if name.startswith("assignments.")}
+    rng = random.Random(seed)
+    keys_examined = {"tail": [], "middle": []}
+    extra_keys = []
+    failures = []
+
+    async def explain(kind: str, name: str, query: dict, limit: int = 0):
+        command = {"find": "assignments", "filter": query, "projection": {"_id": 1}}
+        if limit:
+            command["limit"] = limit
+        plan = summarize_explain(await db.command({"explain": command, "verbosity": "executionStats"}))
+        keys = plan["keys_examined"] or 0
+        keys_examined[kind].append(keys)
+        if plan["collection_scan"] or "IXSCAN" not in plan["stages"] or not overlap_indexes & set(plan["indexes"]):
+            failures.append(f"{kind} {name}: plan {plan['stages']} con índices {plan['indexes']}")
+        elif kind == "tail" and keys > max_keys_examined:
+            failures.append(f"tail {name}: {keys} claves examinadas > {max_keys_examined}")
+        elif kind == "middle":
+            extra_keys.append(keys - (plan["returned"] or 0))
+            if keys - (plan["returned"] or 0) > max_extra_keys:
+                failures.append(f"middle {name}: {keys} claves examinadas para {plan['returned']} reservas")
+
+    def queries(resource_id, start: datetime, end: datetime, max_duration) -> dict:
+        return {
+            "is_overlapping": {"resource_id": resource_id, **get_overlapping_query(start, end, max_duration)},
+            "check_availability": {"resource_id": resource_id, "status": {"$in": ["pending", "active"]},
+                                   **get_overlapping_query(start, end, max_duration)},
+        }
+
+    for _ in range(iterations):
+        resource_id = rng.choice(dataset["resources"])
+        count = await assignments.count_documents({"resource_id": resource_id})
+        if not count:
+            continue
+        max_duration = await get_max_duration(resource_id)
+        if max_duration is None:
+            failures.append(f"el recurso {resource_id} no tiene la duración máxima de sus reservas")
+
+        last = await assignments.find_one({"resource_id": resource_id}, {"end_time": 1}, sort=[("end_time", -1)])
+        start = last["end_time"] - timedelta(minutes=rng.randrange(0, 7 * 24 * 60, 15))
+        for name, query in queries(resource_id, start, start + timedelta(minutes=rng.choice([30, 60, 120])), max_duration).items():
+            await explain("tail", name, query, limit=1)
+
+        middle = await assignments.find_one({"resource_id": resource_id}, {"start_time": 1},
+                                            sort=[("start_time", 1)], skip=rng.randrange(count // 4, count - count // 4 or 1))
+        start = middle["start_time"] + timedelta(minutes=rng.randrange(-120, 120, 15))
+        for name, query in queries(resource_id, start, start + timedelta(minutes=rng.choice([30, 60, 120])), max_duration).items():
+            await explain("middle", name, query)
+
+    def percentiles(values: List[int]) -> dict:
+        values = sorted(values)
+        return {"p50": _percentile(values, 0.50), "p99": _percentile(values, 0.99), "max": values[-1] if values else 0}
+
+    return {
+        "bookings": await assignments.estimated_document_count(),
+        "queries": sum(len(values) for values in keys_examined.values()),
+        "keys_examined": {kind: percentiles(values) for kind, values in keys_examined.items()},
+        # Claves examinadas de más respecto a las reservas devueltas en los huecos intermedios
+        "middle_extra_keys": percentiles(extra_keys),
+        "max_keys_examined": max_keys_examined,
+        "max_extra_keys": max_extra_keys,
+        # Sin repetir el mismo fallo por cada consulta
+        "failures": sorted(set(failures))[:20],
+    }
+
+async def check_availability(client, dataset: dict, iterations: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    resources = [str(resource_id) for resource_id in dataset["resources"]]
+    span_minutes = int((dataset["last_booking"] - dataset["first_booking"]).total_seconds() // 60)
+    windows = []
+    for _ in range(iterations + 10):
+        start = dataset["first_booking"] + timedelta(minutes=rng.randrange(0, max(span_minutes, 1), 15))
+        windows.append((rng.choice(resources), start, start + timedelta(minutes=rng.choice([30, 60, 120]))))
+
+    async def operation(index: int) -> int:
+        resource_id, start, end = windows[index]
+        response = await client.get("/assignments/check-availability/", params={
+            "resource_id": resource_id, "start_time": _format(start), "end_time": _format(end)
+        })
+        return response.status_code
+
+    return await measure(operation, iterations, concurrency, warmup=10)
+
+async def _page_cursors(pages: List[int], limit: int) -> Dict[int, str]:
+    # Cursor de cada página pedida leído directamente del índice (start_time, _id), sin
+    # recorrer el listado página a página por la API
+    from app.database import db
+    from app.pagination_utils import START_TIME_SORT, encode_cursor
+
+    wanted = {page * limit - 1 - limit: page for page in pages if page > 1}
+    cursors = {}
+    if wanted:
+        documents = db["assignments"].find({}, {"start_time": 1}).sort(START_TIME_SORT).limit(max(wanted) + 1)
+        position = 0
+        async for doc in documents:
+            if position in wanted:
+                cursors[wanted[position]] = encode_cursor([doc["start_time"], doc["_id"]])
+            position += 1
+    return cursors
+
+async def get_bookings_deep_pages(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                                  limit: int = 50, pages=(1, 10, 100, 1000, 10000), max_slowdown: float = 3.0) -> dict:
+    """
+    Latencia de get_bookings en páginas cada vez más profundas, hasta la 10.000, pedidas
+    con skip y con el cursor equivalente. Con cursor la latencia debe ser plana: falla si
+    la mediana de la página más profunda supera max_slowdown veces la de la primera.
+    Las páginas que no existen con los datos generados se omiten (la 10.000 necesita
+    --bookings 500000 o más con limit 50).
+    """
+    available = dataset["bookings"] // limit
+    pages = [page for page in pages if page <= available]
+    cursors = await _page_cursors(pages, limit)
+
+    def with_skip(page: int):
+        async def operation(index: int) -> int:
+            response = await client.get("/assignments/", params={"limit": limit, "skip": (page - 1) * limit})
+            return response.status_code
+        return operation
+
+    def with_cursor(page: int):
+        async def operation(index: int) -> int:
+            params = {"limit": limit}
+            if page in cursors:
+                params["cursor"] = cursors[page]
+            response = await client.get("/assignments/", params=params)
+            return response.status_code
+        return operation
+
+    results = {}
+    for page in pages:
+        results[str(page)] = {
+            "skip": await measure(with_skip(page), iterations, concurrency, warmup=5),
+            "cursor": await measure(with_cursor(page), iterations, concurrency, warmup=5),
+        }
+    failures = []
+    if len(pages) > 1:
+        first = results[str(pages[0])]["cursor"]["latency_ms"]["p50"]
+        deepest = results[str(pages[-1])]["cursor"]["latency_ms"]["p50"]
+        if first and deepest > first * max_slowdown:
+            failures.append(f"con cursor la página {pages[-1]} tarda {deepest} ms frente a {first} ms de la primera")
+    return {"pages": results, "page_size": limit, "failures": failures}
+
+async def concurrency_scaling(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                              levels=(1, 4, 16, 64), min_speedup: float = 2.0) -> dict:
+    """
+    Throughput de una lectura que siempre va a MongoDB (una página de get_bookings filtrada
+    por recurso) con distinto número de peticiones en curso. Con el cliente asíncrono las
+    esperas a MongoDB se solapan en el bucle de eventos, así que el throughput debe crecer
+    con las peticiones en curso: falla si con el nivel más alto no llega a min_speedup
+    veces el de una sola petición.
+    """
+    rng = random.Random(seed)
+    resources = [str(resource_id) for resource_id in dataset["resources"]]
+    picks = [rng.choice(resources) for _ in range(iterations + 10)]
+
+    async def operation(index: int) -> int:
+        response = await client.get("/assignments/", params={"resource_id": picks[index], "limit": 10})
+        return response.status_code
+
+    results = {str(level): await measure(operation, iterations, level, warmup=10) for level in levels}
+    base = results[str(levels[0])]["throughput_per_second"]
+    speedup = results[str(levels[-1])]["throughput_per_second"] / base if base else 0.0
+    failures = []
+    if speedup < min_speedup:
+        failures.append(f"con {levels[-1]} peticiones en curso el throughput es {speedup:.1f} veces el de {levels[0]} "
+                        f"(mínimo {min_speedup})")
+    return {"levels": results, "speedup": round(speedup, 2), "failures": failures}
+
+async def login(client, dataset: dict, iterations: int, concurrency: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    usernames = [rng.choice(dataset["usernames"]) for _ in range(iterations + 5)]
+
+    async def operation(index: int) -> int:
+        response = await client.post("/accounts/login", json={"username": usernames[index], "password": BENCH_PASSWORD})
+        return response.status_code
+
+    return await measure(operation, iterations, concurrency, warmup=5)
+
+async def login_storm(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                      storm_concurrency: int = 64, max_slowdown: float = 3.0) -> dict:
+    """
+    Latencia de otras rutas (una página de get_bookings por recurso) sola y mientras
+    storm_concurrency logins se repiten sin pausa. bcrypt corre en el pool de
+    password_service, fuera del bucle de eventos, así que las demás rutas no deben notarlo:
+    falla si su p99 durante la tormenta supera max_slowdown veces el p99 sin ella.
+    """
+    rng = random.Random(seed)
+    resources = [str(resource_id) for resource_id in dataset["resources"]]
+    picks = [rng.choice(resources) for _ in range(iterations + 10)]
+    usernames = dataset["usernames"]
+
+    async def read(index: int) -> int:
+        response = await client.get("/assignments/", params={"resource_id": picks[index], "limit": 10})
+        return response.status_code
+
+    logins = Counter()
+    stop = asyncio.Event()
+
+    async def storm_worker(worker: int):
+        while not stop.is_set():
+            response = await client.post("/accounts/login", json={"username": usernames[(worker + logins.total()) % len(usernames)],
+                                                                  "password": BENCH_PASSWORD})
+            logins[response.status_code] += 1
+
+    baseline = await measure(read, iterations, concurrency, warmup=10)
+    started = time.perf_counter()
+    workers = [asyncio.create_task(storm_worker(worker)) for worker in range(storm_concurrency)]
+    try:
+        # Se da tiempo a que el pool de contraseñas se llene antes de medir
+        await asyncio.sleep(1)
+        during = await measure(read, iterations, concurrency)
+    finally:
+        stop.set()
+        await asyncio.gather(*workers, return_exceptions=True)
+    storm_seconds = time.perf_counter() - started
+
+    failures = []
+    if baseline["latency_ms"]["p99"] and during["latency_ms"]["p99"] > baseline["latency_ms"]["p99"] * max_slowdown:
+        failures.append(f"p99 de get_bookings durante la tormenta de logins: {during['latency_ms']['p99']} ms "
+                        f"frente a {baseline['latency_ms']['p99']} ms")
+    return {
+        "other_routes": baseline,
+        "other_routes_during_login_storm": during,
+        "logins": {str(status): count for status, count in sorted(logins.items())},
+        "login_throughput_per_second": round(sum(logins.values()) / storm_seconds, 2) if storm_seconds else 0.0,
+        "failures": failures,
+    }
+
+def _photo(seed: int, width: int = 2400, height: int = 1600) -> bytes:
+    # Degradado con ruido: se comprime como una foto y cada semilla da bytes distintos,
+    # así el almacenamiento por contenido no las deduplica
+    rng = random.Random(seed)
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    image = Image.blend(image, noise, 0.3)
+    image.putpixel((0, 0), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+async def create_resource_with_images(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                                      images_per_resource: int = 2) -> dict:
+    """
+    Altas de recursos con imágenes de cámara. Además de la latencia de la petición mide
+    cuánto tardan los trabajos en segundo plano en dejar listas las versiones.
+    """
+    from app.services.jobs.jobs_service import jobs_collection
+
+    photos = await asyncio.to_thread(lambda: [_photo(seed * 100000 + index) for index in range(iterations * images_per_resource)])
+    companies = [str(company) for company in dataset["resource_owners"]]
+
+    async def operation(index: int) -> int:
+        resource = {
+            "name": f"Recurso benchmark {index}",
+            "account_id": companies[index % len(companies)],
+            "info": [], "type": "room", "notes": [], "price_per_day": 50
+        }
+        files = [("images", (f"photo{number}.jpg", photos[index * images_per_resource + number], "image/jpeg"))
+                 for number in range(images_per_resource)]
+        response = await client.post("/resources/", data={"resource_data": json.dumps(resource)}, files=files)
+        return response.status_code
+
+    result = await measure(operation, iterations, concurrency)
+    start = time.perf_counter()
+    while await jobs_collection.count_documents({"status": {"$in": ["queued", "running"]}}):
+        await asyncio.sleep(0.05)
+    result["background_drain_seconds"] = round(time.perf_counter() - start, 3)
+    result["image_bytes_mean"] = round(statistics.fmean(len(photo) for photo in photos)) if photos else 0
+    return result
+
+async def upload_image_batch(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                             images: int = 10, latency: float = 0.2, max_ratio: float = 2.0) -> dict:
+    """
+    Subida de las imágenes de una petición típica (images) con blob_service.upload_images
+    contra un almacén que tarda latency segundos por bloque. Las imágenes de una petición
+    se suben a la vez, así que el lote completo no puede tardar más de max_ratio veces la
+    subida individual más lenta de otras tantas imágenes subidas de una en una.
+    """
+    from bson import ObjectId
+    from starlette.datastructures import Headers, UploadFile
+    from app.services.blob.blob_service import get_backend, release_resource_images, upload_image, upload_images
+
+    def files(photos: List[bytes]) -> List[UploadFile]:
+        return [UploadFile(BytesIO(photo), filename=f"photo{number}.jpg", headers=Headers({"content-type": "image/jpeg"}))
+                for number, photo in enumerate(photos)]
+
+    backend = get_backend()
+    previous_latency = backend.latency
+    backend.latency = latency
+    resource_ids = []
+    batches = []
+    single_max = 0.0
+    try:
+        for iteration in range(iterations):
+            # Fotos distintas en cada subida: el almacenamiento por contenido no las deduplica
+            photos = await asyncio.to_thread(lambda: [_photo(seed * 100000 + iteration * 2 * images + index)
+                                                      for index in range(2 * images)])
+            resource_id = str(ObjectId())
+            resource_ids.append(resource_id)
+            for file in files(photos[:images]):
+                start = time.perf_counter()
+                await upload_image(file, resource_id)
+                single_max = max(single_max, time.perf_counter() - start)
+            start = time.perf_counter()
+            await upload_images(files(photos[images:]), resource_id)
+            batches.append(time.perf_counter() - start)
+    finally:
+        backend.latency = previous_latency
+        for resource_id in resource_ids:
+            await release_resource_images(resource_id)
+
+    failures = []
+    batch_max = max(batches, default=0.0)
+    if batch_max > max_ratio * single_max:
+        failures.append(f"{images} imágenes en una petición tardan {round(batch_max * 1000, 1)} ms; "
+                        f"la subida individual más lenta, {round(single_max * 1000, 1)} ms")
+    return {
+        "images": images,
+        "single_upload_max_ms": round(single_max * 1000, 3),
+        "batch_ms": {"mean": round(statistics.fmean(batches) * 1000, 3) if batches else 0.0,
+                     "max": round(batch_max * 1000, 3)},
+        "failures": failures,
+    }
+
+async def _export(client, file_format: str, params: dict) -> tuple:
+    # (código HTTP, filas, pico de memoria reservada en este proceso durante la descarga)
+    tracemalloc.start()
+    try:
+        count = 0
+        async with client.stream("GET", "/assignments/export", params={"format": file_format, **params}) as response:
+            async for line in response.aiter_lines():
+                count += 1 if line else 0
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return response.status_code, count - (1 if file_format == "csv" else 0), peak
+
+async def export_bookings(client, dataset: dict, iterations: int, concurrency: int, seed: int,
+                          fractions: tuple = (0.01, 0.1, 1.0), max_peak_growth: float = 2.0) -> dict:
+    """
+    Exportación completa de las reservas en cada formato: latencia y filas por segundo.
+
+    La memoria se mide exportando ventanas de fechas cada vez mayores (fractions del
+    periodo de las reservas, terminando en la última). El pico de memoria de la ventana
+    completa no puede superar en más de max_peak_growth veces el de la de fractions[1]:
+    si la exportación no fuera en streaming crecería con las filas. El transporte del
+    cliente entrega la respuesta por bloques, así que el pico es el de la aplicación.
+    """
+    first, last = dataset["first_booking"], dataset["last_booking"]
+    windows = [{"start_date": _format(last - (last - first) * fraction), "end_date": _format(last)}
+               for fraction in fractions]
+    result = {}
+    failures = []
+    for file_format in ("ndjson", "csv"):
+        rows = []
+
+        async def operation(index: int) -> int:
+            status, count, _ = await _export(client, file_format, {})
+            rows.append(count)
+            return status
+
+        summary = await measure(operation, iterations, 1)
+        summary["rows"] = rows[-1] if rows else 0
+        summary["rows_per_second"] = round(summary["rows"] / (summary["latency_ms"]["mean"] / 1000), 1) if summary["latency_ms"]["mean"] else 0.0
+
+        memory = []
+        for window in windows:
+            _, count, peak = await _export(client, file_format, window)
+            memory.append({"rows": count, "peak_traced_mb": round(peak / 2 ** 20, 2)})
+        summary["memory_by_rows"] = memory
+        summary["peak_traced_mb"] = max(entry["peak_traced_mb"] for entry in memory)
+        reference = memory[min(1, len(memory) - 1)]
+        if memory[-1]["peak_traced_mb"] > max_peak_growth * reference["peak_traced_mb"]:
+            failures.append(f"{file_format}: el pico de memoria pasa de {reference['peak_traced_mb']} MB con "
+                            f"{reference['rows']} filas a {memory[-1]['peak_traced_mb']} MB con {memory[-1]['rows']}")
+        result[file_format] = summary
+    result["failures"] = failures
+    return result
+
+# Escenarios por nombre, en el orden en que se ejecutan, con sus iteraciones por defecto
+SCENARIOS: Dict[str, tuple] = {
+    "overlap_query_plan": (overlap_query_plan, 50),
+    "check_availability": (check_availability, 2000),
+    "get_bookings_deep_pages": (get_bookings_deep_pages, 100),
+    "concurrency_scaling": (concurrency_scaling, 1000),
+    "login": (login, 100),
+    "login_storm": (login_storm, 500),
+    "create_assignment_contention": (create_assignment_contention, 2000),
+    "create_resource_with_images": (create_resource_with_images, 20),
+    "upload_image_batch": (upload_image_batch, 3),
+    "export_bookings": (export_bookings, 3),
+}
@@ -0,0 +1,98 @@
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, List
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from benchmarks.data_generator import _resource_bookings
+
+def _documents(page_size: int, seed: int) -> dict:
+    """
+    Páginas de documentos como los guarda la API: con los campos de versión, sin los
+    campos que tienen valor por defecto en el modelo y, en los recursos, con una clave
+    que el cliente añadió en resource_data y que no forma parte de la respuesta.
+    """
+    rng = random.Random(seed)
+    version = {"version": 3, "updated_at": datetime.now(timezone.utc)}
+    accounts = [{
+        "_id": ObjectId(), "name": f"Client {index}", "email": f"user{index}@bench.example.com",
+        "username": f"user{index}", "account_type": "client", "thumbnailUrl": ""
+    } for index in range(page_size)]
+    resources = [{
+        "_id": ObjectId(), "name": f"Recurso {index}", "account_id": ObjectId(), "info": ["Wifi"], "type": "room",
+        "notes": [], "thumbnailUrl": "", "rawImagesUrls": [], "price_per_day": round(rng.uniform(10, 200), 2),
+        "internal_notes": "no se devuelve", **version
+    } for index in range(page_size)]
+    bookings = _resource_bookings(ObjectId(), page_size, [ObjectId() for _ in range(10)], datetime(2024, 1, 1), rng, version)
+    for booking in bookings:
+        booking["_id"] = ObjectId()
+    return {"accounts": accounts, "resources": resources, "assignments": bookings}
+
+def _old_path(model) -> Callable[[List[dict]], bytes]:
+    # serialize_doc, validación contra response_model y JSONResponse, como hacía FastAPI
+    from app.database import serialize_doc
+
+    adapter = TypeAdapter(List[model])
+    def render(docs: List[dict]) -> bytes:
+        validated = adapter.validate_python([serialize_doc(doc) for doc in docs])
+        content = jsonable_encoder(adapter.dump_python(validated, mode="json", by_alias=True))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+    return render
+
+def _new_path(shape) -> Callable[[List[dict]], bytes]:
+    from app.json_utils import BSONJSONResponse
+
+    def render(docs: List[dict]) -> bytes:
+        return BSONJSONResponse(content=[shape.to_json(doc) for doc in docs]).body
+    return render
+
+def _time(render: Callable[[List[dict]], bytes], docs: List[dict], repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        render(docs)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el serializado anterior y el actual de las respuestas de listado")
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    from app.models.account import AccountResponse
+    from app.models.assignment import AssignmentResponse
+    from app.models.resource import ResourceResponse
+    from app.routes.accounts import ACCOUNT_SHAPE
+    from app.routes.assignments import ASSIGNMENT_SHAPE
+    from app.routes.resources import RESOURCE_SHAPE
+
+    pages = _documents(args.page_size, args.seed)
+    paths = {
+        "accounts": (AccountResponse, ACCOUNT_SHAPE),
+        "resources": (ResourceResponse, RESOURCE_SHAPE),
+        "assignments": (AssignmentResponse, ASSIGNMENT_SHAPE),
+    }
+    report = {"page_size": args.page_size, "routes": {}, "failures": []}
+    for name, (model, shape) in paths.items():
+        old, new = _old_path(model), _new_path(shape)
+        docs = pages[name]
+        # El cuerpo debe ser el mismo que con el response_model (to_json no modifica docs)
+        if json.loads(old(docs)) != json.loads(new(docs)):
+            report["failures"].append(f"{name}: el cuerpo no coincide con el del response_model")
+        old_ms, new_ms = _time(old, docs, args.repeats), _time(new, docs, args.repeats)
+        report["routes"][name] = {"old_ms": round(old_ms, 3), "new_ms": round(new_ms, 3),
+                                  "speedup": round(old_ms / new_ms, 1) if new_ms else 0.0}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report["failures"] else 0)
+
+# Para ejecutar con `python -m benchmarks.serialization`; no necesita MongoDB y termina con
+# código 1 si el cuerpo de alguna respuesta cambia respecto al response_model
+if __name__ == "__main__":
+    main()
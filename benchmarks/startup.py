@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from benchmarks.environment import LocalMongo
+
+# Módulos pesados que importar app.main no debe cargar: se importan al usarlos
+LAZY_MODULES = ["azure", "numpy", "PIL", "uvicorn", "passlib"]
+
+# FastAPI y pymongo se importan primero en el mismo intérprete: lo que tarda después
+# app.main es solo lo que añade la aplicación, sin restar medidas de procesos distintos
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import fastapi, pymongo
+framework = time.perf_counter()
+import app.main
+end = time.perf_counter()
+print(json.dumps({"framework_ms": (framework - start) * 1000, "app_ms": (end - framework) * 1000,
+                  "modules": sorted({name.split(".")[0] for name in sys.modules})}))
+"""
+
+COLD_START_SCRIPT = """
+import asyncio, json, time
+start = time.perf_counter()
+import httpx
+from app.main import app
+
+async def main():
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/")
+            response.raise_for_status()
+            print(json.dumps({"ms": (time.perf_counter() - start) * 1000}))
+
+asyncio.run(main())
+"""
+
+def _run(script: str, env: dict) -> dict:
+    # Un intérprete nuevo por medida: sin módulos ya cargados ni cachés calientes del proceso
+    result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure_imports(runs: int) -> dict:
+    # Sin variables de MongoDB: importar la aplicación no debe necesitarlas
+    env = {key: value for key, value in os.environ.items() if key not in ("MONGODB_URI", "DATABASE_NAME")}
+    measures = [_run(IMPORT_SCRIPT, env) for _ in range(runs)]
+    loaded = set(measures[-1]["modules"])
+    framework_ms = statistics.median(run["framework_ms"] for run in measures)
+    app_ms = statistics.median(run["app_ms"] for run in measures)
+    return {
+        "import_ms": round(statistics.median(run["framework_ms"] + run["app_ms"] for run in measures), 1),
+        "framework_import_ms": round(framework_ms, 1),
+        # Lo que añade la aplicación sobre FastAPI y pymongo
+        "app_import_overhead_ms": round(app_ms, 1),
+        "eager_heavy_modules": [module for module in LAZY_MODULES if module in loaded],
+    }
+
+def measure_cold_start(mongodb_uri: str, runs: int) -> float:
+    env = {**os.environ, "MONGODB_URI": mongodb_uri, "DATABASE_NAME": "reservify_startup", "LOG_LEVEL": "WARNING"}
+    return round(statistics.median(_run(COLD_START_SCRIPT, env)["ms"] for _ in range(runs)), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el tiempo de importación y de arranque en frío y lo compara con un presupuesto")
+    parser.add_argument("--runs", type=int, default=5)
+    # Medido en este commit: la aplicación añade entre un 20 y un 25 % de lo que tardan FastAPI y
+    # pymongo. Como proporción el presupuesto vale en máquinas más lentas o más rápidas.
+    parser.add_argument("--import-overhead-budget-ratio", type=float, default=0.4,
+                        help="Máximo que puede añadir importar app.main, como fracción de importar fastapi y pymongo")
+    parser.add_argument("--import-overhead-budget-ms", type=float,
+                        help="Máximo absoluto, en milisegundos, además de la proporción")
+    parser.add_argument("--cold-start-budget-ms", type=float, default=3000,
+                        help="Máximo desde el inicio del intérprete hasta responder la primera petición")
+    parser.add_argument("--mongodb-uri", help="Servidor para el arranque en frío; por defecto se arranca un mongod temporal")
+    parser.add_argument("--mongod", help="Ruta del binario mongod (por defecto el del PATH)")
+    parser.add_argument("--skip-cold-start", action="store_true", help="Solo mide la importación (no necesita MongoDB)")
+    args = parser.parse_args()
+
+    report = measure_imports(args.runs)
+    failures = []
+    if report["eager_heavy_modules"]:
+        failures.append(f"app.main importa al cargarse: {', '.join(report['eager_heavy_modules'])}")
+    report["app_import_overhead_ratio"] = round(report["app_import_overhead_ms"] / report["framework_import_ms"], 3)
+    if report["app_import_overhead_ratio"] > args.import_overhead_budget_ratio:
+        failures.append(f"importación: {report['app_import_overhead_ratio']} > {args.import_overhead_budget_ratio} "
+                        f"de lo que tardan fastapi y pymongo")
+    if args.import_overhead_budget_ms is not None and report["app_import_overhead_ms"] > args.import_overhead_budget_ms:
+        failures.append(f"importación: {report['app_import_overhead_ms']} ms > {args.import_overhead_budget_ms} ms")
+
+    if not args.skip_cold_start:
+        if args.mongodb_uri:
+            report["cold_start_ms"] = measure_cold_start(args.mongodb_uri, args.runs)
+        else:
+            with LocalMongo(args.mongod) as mongo:
+                report["cold_start_ms"] = measure_cold_start(mongo.uri, args.runs)
+        if report["cold_start_ms"] > args.cold_start_budget_ms:
+            failures.append(f"arranque en frío: {report['cold_start_ms']} ms > {args.cold_start_budget_ms} ms")
+
+    report["budget"] = {"import_overhead_ratio": args.import_overhead_budget_ratio,
+                        "import_overhead_ms": args.import_overhead_budget_ms, "cold_start_ms": args.cold_start_budget_ms}
+    report["failures"] = failures
+    print(json.dumps(report, indent=2))
+    sys.exit(1 if failures else 0)
+
+# Para ejecutar con `python -m benchmarks.startup`; termina con código 1 si se supera el presupuesto
+if __name__ == "__main__":
+    main()
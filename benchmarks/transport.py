@@ -0,0 +1,105 @@
+import asyncio
+from typing import AsyncIterator, Optional
+from urllib.parse import unquote
+import httpx
+
+class _ResponseBody(httpx.AsyncByteStream):
+    def __init__(self, chunks: asyncio.Queue, task: asyncio.Task):
+        self._chunks = chunks
+        self._task = task
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await self._chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        # Los errores de la aplicación después de empezar la respuesta llegan aquí
+        await self._task
+
+    async def aclose(self):
+        if not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    """
+    Transporte de httpx que llama a la aplicación ASGI en el mismo proceso, como
+    httpx.ASGITransport, pero entrega el cuerpo de la respuesta a medida que la aplicación
+    lo envía. httpx.ASGITransport lo junta entero en memoria antes de devolver la
+    respuesta, así que con él ninguna medida de memoria de una descarga es válida.
+
+    La cola entre la aplicación y el cliente tiene como mucho max_buffered_chunks
+    bloques: si el cliente no lee, la aplicación espera, igual que con un socket.
+    """
+
+    def __init__(self, app, max_buffered_chunks: int = 16, client: tuple = ("127.0.0.1", 123)):
+        self.app = app
+        self.max_buffered_chunks = max_buffered_chunks
+        self.client = client
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": request.method,
+            "headers": [(key.lower(), value) for key, value in request.headers.raw],
+            "scheme": request.url.scheme,
+            "path": unquote(request.url.path),
+            "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query,
+            "server": (request.url.host, request.url.port),
+            "client": self.client,
+            "root_path": "",
+        }
+        request_chunks = request.stream.__aiter__()
+        request_complete = False
+        response_complete = asyncio.Event()
+        response_started = asyncio.Event()
+        chunks: asyncio.Queue = asyncio.Queue(self.max_buffered_chunks)
+        start: Optional[dict] = None
+
+        async def receive() -> dict:
+            nonlocal request_complete
+            if request_complete:
+                await response_complete.wait()
+                return {"type": "http.disconnect"}
+            try:
+                body = await request_chunks.__anext__()
+            except StopAsyncIteration:
+                request_complete = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            return {"type": "http.request", "body": body, "more_body": True}
+
+        async def send(message: dict):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                response_started.set()
+            elif message["type"] == "http.response.body" and not response_complete.is_set():
+                body = message.get("body", b"")
+                if body and request.method != "HEAD":
+                    await chunks.put(body)
+                if not message.get("more_body", False):
+                    response_complete.set()
+                    await chunks.put(None)
+
+        async def run():
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                if not response_complete.is_set():
+                    response_complete.set()
+                    await chunks.put(None)
+
+        task = asyncio.create_task(run())
+        started = asyncio.create_task(response_started.wait())
+        await asyncio.wait({task, started}, return_when=asyncio.FIRST_COMPLETED)
+        if start is None:
+            started.cancel()
+            # Sin respuesta: se propaga el error de la aplicación, como httpx.ASGITransport
+            await task
+            raise RuntimeError("La aplicación terminó sin enviar una respuesta")
+        return httpx.Response(start["status"], headers=start.get("headers", []),
+                              stream=_ResponseBody(chunks, task))